@@ -0,0 +1,154 @@
+from collections import namedtuple
+
+import numpy as np
+
+from cash_flows import *
+from deal_valuation import _mortgage_payment
+
+AmortizationPeriod = namedtuple("AmortizationPeriod", ["period", "payment", "interest", "principal", "prepayment", "balance", "equity"])
+AmortizationPeriod.__doc__ = """
+The amortization of a period, with one value per loan in each field.
+"""
+
+# fields of an amortization schedule, one array per field
+amortization_fields = list(AmortizationPeriod._fields[1:])
+
+
+def _per_loan(value, shape) -> np.ndarray:
+    return np.broadcast_to(np.asarray(value, dtype=np.float64), shape)
+
+
+def _horizon(number_periods, refinancing: dict) -> int:
+    # the last period any loan can reach, at its term or the term of a refinancing
+    return int(max([np.max(number_periods, initial=0)] + [period + new_periods - 1 for period, (_, new_periods) in (refinancing or {}).items()]))
+
+
+def iter_amortization(principal, mortgage_rate, number_periods, time_frame: str = "M", down_payment=0, prepayments: dict = None, rate_resets: dict = None, refinancing: dict = None):
+    """
+    Amortizes one or many mortgages lazily, one period at a time, so only one value per loan is held in memory.
+
+    The level payment is recomputed on the remaining balance and term when the rate resets, and on the remaining balance
+    and new term on refinancing. Prepayments reduce the balance and keep the payment, so the loan is repaid earlier.
+
+    Args:
+    - principal (float or array-like of float): the amount borrowed on each loan
+    - mortgage_rate (float or array-like of float): the yearly rate of each loan
+    - number_periods (int or array-like of int): the number of payments of each loan
+    - time_frame (str): the time frame of the payments. Must be one of "Y", "M", "W", "D"
+    - down_payment (float or array-like of float): the equity of each loan before the first payment
+    - prepayments (dict): the extra principal paid at the end of a period, by period. Each amount is a float or one per loan
+    - rate_resets (dict): the new yearly rate from a period on, by period. Each rate is a float or one per loan
+    - refinancing (dict): the new yearly rate and number of payments from a period on, by period, as (rate, number_periods) tuples
+
+    Yields:
+    - AmortizationPeriod: the amortization of each period, from period 1 until every loan is repaid or reaches its term
+
+    Raises:
+    - Exception: if time_frame is not one of "Y", "M", "W", "D"
+    """
+    if time_frame not in time_frames:
+        raise Exception("Time frame must be Y/M/W/D")
+    prepayments = prepayments or {}
+    rate_resets = rate_resets or {}
+    refinancing = refinancing or {}
+    shape = np.broadcast_shapes(np.shape(principal), np.shape(mortgage_rate), np.shape(number_periods), np.shape(down_payment))
+    balance = np.array(_per_loan(principal, shape))
+    equity = np.array(_per_loan(down_payment, shape))
+    rate = convert_rate(_per_loan(mortgage_rate, shape), "Y", time_frame)
+    last_period = np.array(np.broadcast_to(number_periods, shape), dtype=np.int64)
+    payment = _mortgage_payment(balance, rate, last_period)
+    horizon = _horizon(number_periods, refinancing)
+    for period in range(1, horizon + 1):
+        if period in rate_resets:
+            rate = convert_rate(_per_loan(rate_resets[period], shape), "Y", time_frame)
+            payment = _mortgage_payment(balance, rate, np.maximum(last_period - period + 1, 1))
+        if period in refinancing:
+            new_rate, new_periods = refinancing[period]
+            rate = convert_rate(_per_loan(new_rate, shape), "Y", time_frame)
+            last_period = np.full(shape, period + new_periods - 1, dtype=np.int64)
+            payment = _mortgage_payment(balance, rate, new_periods)
+        interest = balance * rate
+        principal_paid = np.minimum(payment - interest, balance)
+        # the last payment of a term repays whatever is left
+        principal_paid = np.where(period >= last_period, balance, principal_paid)
+        prepayment = np.minimum(_per_loan(prepayments.get(period, 0.0), shape), balance - principal_paid)
+        balance = balance - principal_paid - prepayment
+        equity = equity + principal_paid + prepayment
+        yield AmortizationPeriod(period, interest + principal_paid, interest, principal_paid, prepayment, balance, equity)
+        if not balance.any():
+            break
+
+
+class AmortizationSchedule:
+    """
+    A class that represents the amortization of one or many mortgages, with one array per field.
+    Arrays have one row per loan and one column per period, or one value per period for a single loan.
+    """
+    def __init__(self, time_frame: str, **fields) -> None:
+        """
+        Initializes an AmortizationSchedule object with the time frame of the periods and the amortization arrays.
+
+        Args:
+        - time_frame (str): the time frame of the periods. Must be one of "Y", "M", "W", "D"
+        - **fields: the arrays of payment, interest, principal, prepayment, balance and equity, or some of them
+        """
+        if time_frame not in time_frames:
+            raise Exception("Time frame must be Y/M/W/D")
+        self.time_frame = time_frame
+        self.fields = fields
+        for name, values in fields.items():
+            setattr(self, name, values)
+
+    @property
+    def periods(self) -> np.ndarray:
+        return np.arange(1, next(iter(self.fields.values())).shape[-1] + 1)
+
+    def get_present_value(self, discount_rate: InterestRate):
+        """
+        Calculates the present value of the payments and prepayments of each loan, as negative cash flows.
+
+        Args:
+        - discount_rate (InterestRate): the discount rate to use for calculating the present value
+
+        Returns:
+        - float or np.ndarray: the present value of each loan
+
+        Raises:
+        - KeyError: if the schedule was built without the payment or prepayment field
+        """
+        factors = discount_rate.discount_factors(self.time_frame, len(self.periods))[1:]
+        present_value = -(self.fields["payment"] + self.fields["prepayment"]) @ factors
+        return float(present_value) if np.ndim(present_value) == 0 else present_value
+
+
+def amortization_schedule(principal, mortgage_rate, number_periods, time_frame: str = "M", down_payment=0, prepayments: dict = None, rate_resets: dict = None, refinancing: dict = None,
+                          fields: tuple = tuple(amortization_fields), dtype=np.float64) -> AmortizationSchedule:
+    """
+    Amortizes one or many mortgages into arrays. Keeping fewer fields or a float32 dtype reduces memory for large batches,
+    and iter_amortization avoids holding the periods at all.
+
+    Args:
+    - the arguments of iter_amortization
+    - fields (tuple of str): the fields to keep, among payment, interest, principal, prepayment, balance, equity
+    - dtype: the dtype of the arrays
+
+    Returns:
+    - AmortizationSchedule: the amortization of each loan
+
+    Raises:
+    - Exception: if time_frame is not one of "Y", "M", "W", "D"
+    - ValueError: if a field is unknown
+    """
+    unknown = set(fields) - set(amortization_fields)
+    if unknown:
+        raise ValueError(f"Unknown amortization fields: {', '.join(sorted(unknown))}")
+    # the arrays are allocated once and filled a period at a time, so no second copy of them is ever held
+    shape = np.broadcast_shapes(np.shape(principal), np.shape(mortgage_rate), np.shape(number_periods), np.shape(down_payment))
+    columns = {name: np.empty(shape + (_horizon(number_periods, refinancing),), dtype=dtype) for name in fields}
+    count = 0
+    for amortization in iter_amortization(principal, mortgage_rate, number_periods, time_frame, down_payment, prepayments, rate_resets, refinancing):
+        for name in fields:
+            columns[name][..., count] = getattr(amortization, name)
+        count += 1
+    # loans repaid early by prepayments end before the horizon
+    return AmortizationSchedule(time_frame, **{name: values[..., :count] for name, values in columns.items()})
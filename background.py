@@ -0,0 +1,103 @@
+import queue
+import threading
+
+
+class Cancelled(Exception):
+    """
+    Raised inside a background task when a newer task has replaced it.
+    """
+
+
+class BackgroundRunner:
+    """
+    A class that runs one task at a time on a worker thread and hands its progress and result back to the Tk thread.
+
+    The worker thread posts messages to a queue that is polled with after(), so the callbacks always run in the Tk thread.
+    Submitting a task cancels the previous one, whose messages are then ignored.
+    """
+    def __init__(self, master, poll_interval: int = 50) -> None:
+        """
+        Initializes a BackgroundRunner object with the Tk widget used to schedule polling and the polling interval.
+
+        Args:
+        - master: the Tk widget whose after() method is used to poll the queue
+        - poll_interval (int): the number of milliseconds between two polls of the queue
+        """
+        self.master = master
+        self.poll_interval = poll_interval
+        self._messages = queue.Queue()
+        self._run_id = 0
+        self._cancel_event = None
+        self._callbacks = None
+        self._polling = False
+
+    def submit(self, task, on_done, on_error=None, on_progress=None) -> None:
+        """
+        Runs a task on a worker thread, cancelling the task that is running, if any.
+
+        Args:
+        - task (callable): called on the worker thread with a report function. The task calls report(fraction) to
+          report its progress, between 0 and 1, and report raises Cancelled once the task has been replaced
+        - on_done (callable): called in the Tk thread with the result of the task
+        - on_error (callable): called in the Tk thread with the exception raised by the task
+        - on_progress (callable): called in the Tk thread with the progress reported by the task
+        """
+        self.cancel()
+        self._run_id += 1
+        run_id = self._run_id
+        cancel_event = threading.Event()
+        self._cancel_event = cancel_event
+        self._callbacks = (on_done, on_error, on_progress)
+
+        def report(fraction: float) -> None:
+            if cancel_event.is_set():
+                raise Cancelled()
+            self._messages.put((run_id, "progress", fraction))
+
+        def work() -> None:
+            try:
+                result = task(report)
+            except Cancelled:
+                return
+            except Exception as error:
+                self._messages.put((run_id, "error", error))
+            else:
+                self._messages.put((run_id, "done", result))
+
+        threading.Thread(target=work, daemon=True).start()
+        if not self._polling:
+            self._polling = True
+            self.master.after(self.poll_interval, self._poll)
+
+    def cancel(self) -> None:
+        """
+        Cancels the task that is running, if any. Its result will not be handed back.
+        """
+        if self._cancel_event is not None:
+            self._cancel_event.set()
+            self._cancel_event = None
+            self._callbacks = None
+
+    def _poll(self) -> None:
+        while True:
+            try:
+                run_id, kind, payload = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            if run_id != self._run_id or self._callbacks is None:
+                continue
+            on_done, on_error, on_progress = self._callbacks
+            if kind == "progress":
+                if on_progress is not None:
+                    on_progress(payload)
+                continue
+            self._cancel_event = None
+            self._callbacks = None
+            if kind == "done":
+                on_done(payload)
+            elif on_error is not None:
+                on_error(payload)
+        if self._callbacks is None and self._messages.empty():
+            self._polling = False
+        else:
+            self.master.after(self.poll_interval, self._poll)
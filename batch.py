@@ -0,0 +1,175 @@
+import argparse
+import csv
+import os
+
+import numpy as np
+
+from deal_valuation import *
+
+# deal inputs that may be left out of an input file, with the value used instead
+optional_deal_inputs = {"non_receipt_chance": 0.0, "rent_growth": 0.0, "maintenance_cost": 0.0, "costs_growth": 0.0}
+
+
+def _is_parquet(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in (".parquet", ".pq")
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Reading or writing Parquet files requires pyarrow") from None
+    return pyarrow
+
+
+def _columns(header: list, rows: list) -> dict:
+    return {name: [row[index] for row in rows] for index, name in enumerate(header)}
+
+
+def _parse_column(name: str, values, first_row: int) -> np.ndarray:
+    # an empty cell, or a null in a Parquet file, is missing, and an optional input takes its default instead
+    if not (isinstance(values, np.ndarray) and values.dtype.kind in "iuf"):
+        values = [np.nan if value is None or (isinstance(value, str) and not value.strip()) else value for value in values]
+    column = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(column)
+    if missing.any():
+        if name not in optional_deal_inputs:
+            raise ValueError(f"Row {first_row + int(np.argmax(missing))}: missing value of deal input {name}")
+        column = np.where(missing, optional_deal_inputs[name], column)
+    if name == "mortgage_length":
+        # mortgages last whole years, as in DealModel and the command line
+        fractional = column != np.floor(column)
+        if fractional.any():
+            row = int(np.argmax(fractional))
+            raise ValueError(f"Row {first_row + row}: mortgage_length must be a whole number of years, not {column[row]:g}")
+    return column
+
+
+def read_deal_chunks(path: str, chunk_size: int = 100000):
+    """
+    Reads deal rows from a CSV or Parquet file, a chunk at a time.
+
+    Args:
+    - path (str): the path of the file. Files ending in .parquet or .pq are read as Parquet, any other file as CSV with a header
+    - chunk_size (int): the maximum number of rows in a chunk
+
+    Yields:
+    - dict: the columns of the chunk, by name. A file without rows yields one empty chunk, so its columns are known
+
+    Raises:
+    - ValueError: if the file is a CSV file without a header
+    - ImportError: if the file is a Parquet file and pyarrow is not installed
+    """
+    if _is_parquet(path):
+        pyarrow = _import_pyarrow()
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        empty = True
+        for record_batch in parquet_file.iter_batches(batch_size=chunk_size):
+            empty = False
+            yield {name: column.to_numpy(zero_copy_only=False) for name, column in zip(record_batch.schema.names, record_batch.columns)}
+        if empty:
+            yield {name: [] for name in parquet_file.schema_arrow.names}
+        return
+    with open(path, newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError(f"Deals file has no header: {path}")
+        rows = []
+        empty = True
+        for row in reader:
+            rows.append(row)
+            if len(rows) == chunk_size:
+                yield _columns(header, rows)
+                rows = []
+                empty = False
+        if rows or empty:
+            yield _columns(header, rows)
+
+
+def value_deal_chunk(columns: dict, first_row: int = 1) -> dict:
+    """
+    Values a chunk of deals, adding their present value and maximum price of property to the columns.
+
+    Args:
+    - columns (dict): the columns of the chunk, by name. Must hold every deal input except the optional ones, whose
+      empty cells take their default value
+    - first_row (int): the number of the first row of the chunk in its file, counting from 1 after the header, used in errors
+
+    Returns:
+    - dict: the columns of the chunk, with the deal inputs parsed as floats and present_value and price_of_property appended
+
+    Raises:
+    - KeyError: if a required deal input is missing
+    - ValueError: if a required deal input has an empty cell, or a mortgage length is not a whole number of years
+    """
+    length = len(next(iter(columns.values())))
+    inputs = {}
+    for name in deal_inputs:
+        if name in columns:
+            inputs[name] = _parse_column(name, columns[name], first_row)
+        elif name in optional_deal_inputs:
+            inputs[name] = np.full(length, optional_deal_inputs[name])
+        else:
+            raise KeyError(f"Missing deal input column: {name}")
+    valued = dict(columns)
+    valued.update((name, inputs[name]) for name in deal_inputs if name in columns)
+    valued["present_value"] = present_value_of_deals(**inputs)
+    del inputs["property_price"]
+    valued["price_of_property"] = price_of_property_of_deals(**inputs)
+    return valued
+
+
+def value_file(input_path: str, output_path: str, chunk_size: int = 100000) -> int:
+    """
+    Values every deal of a CSV or Parquet file and streams the results to a CSV or Parquet file, one chunk at a time,
+    so memory does not grow with the number of rows.
+
+    Args:
+    - input_path (str): the path of the deals file
+    - output_path (str): the path of the results file. Files ending in .parquet or .pq are written as Parquet, any other file as CSV
+    - chunk_size (int): the maximum number of rows valued at once
+
+    Returns:
+    - int: the number of deals valued
+
+    Raises:
+    - KeyError: if a required deal input is missing
+    - ValueError: if a required deal input has an empty cell, a mortgage length is not a whole number of years, or the
+      input is a CSV file without a header
+    - ImportError: if a file is a Parquet file and pyarrow is not installed
+    """
+    count = 0
+    if _is_parquet(output_path):
+        pyarrow = _import_pyarrow()
+        writer = None
+        try:
+            for columns in read_deal_chunks(input_path, chunk_size):
+                table = pyarrow.table(value_deal_chunk(columns, count + 1))
+                if writer is None:
+                    writer = pyarrow.parquet.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+                count += table.num_rows
+        finally:
+            if writer is not None:
+                writer.close()
+        return count
+    with open(output_path, "w", newline="") as file:
+        writer = csv.writer(file)
+        for chunk, columns in enumerate(read_deal_chunks(input_path, chunk_size)):
+            valued = value_deal_chunk(columns, count + 1)
+            if chunk == 0:
+                writer.writerow(valued)
+            writer.writerows(zip(*(np.asarray(column).tolist() for column in valued.values())))
+            count += len(valued["present_value"])
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Value the deals of a CSV or Parquet file.")
+    parser.add_argument("input", help="deals file, with one column per deal input")
+    parser.add_argument("output", help="results file")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="number of rows valued at once")
+    arguments = parser.parse_args()
+    print(f"Valued {value_file(arguments.input, arguments.output, arguments.chunk_size)} deals")
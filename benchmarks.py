@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import platform
+from random import seed as seed_random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+
+from mc_cash_flow import *
+from deal_model import DealModel
+
+# deal used by the App flow benchmarks
+benchmark_deal = {"property_price": 300000, "down_payment": 50000, "discount_rate": 0.06, "mortgage_rate": 0.045, "mortgage_length": 25,
+                  "rent_amount": 2000, "non_receipt_chance": 0.05, "rent_growth": 0.02, "maintenance_cost": 3000, "costs_growth": 0.02}
+
+# ratio of the baseline wall time above which a benchmark is reported as a regression
+regression_threshold = 1.25
+
+# command lines of the headless CLI whose cold start is measured
+cli_commands = {
+    "cli present-value": ["present-value", "--property-price", "300000", "--down-payment", "50000", "--discount-rate", "0.06", "--mortgage-rate", "0.045",
+                          "--mortgage-length", "25", "--rent-amount", "2000", "--non-receipt-chance", "0.05", "--rent-growth", "0.02", "--maintenance-cost", "3000", "--costs-growth", "0.02"],
+    "cli price": ["price", "--down-payment", "50000", "--discount-rate", "0.06", "--mortgage-rate", "0.045", "--mortgage-length", "25", "--rent-amount", "2000"],
+    "cli simulate": ["simulate", "--property-price", "300000", "--down-payment", "50000", "--discount-rate", "0.06", "--mortgage-rate", "0.045",
+                     "--mortgage-length", "25", "--rent-amount", "2000", "--non-receipt-chance", "0.05", "--trials", "1000", "--seed", "0"],
+}
+
+
+def _benchmarks() -> dict:
+    discount_rate = InterestRate(0.06)
+    growth = InterestRate(0.02)
+    benchmarks = {}
+    for time_frame in time_frames:
+        periods = 30 * time_frame_conversion[time_frame]
+        annuity = Annuity(100, periods, time_frame, growth)
+        perpetuity = Perpetuity(100, time_frame, growth)
+        mc_annuity = MonteCarloAnnuity(100, periods, time_frame, growth, 0.05)
+        mc_perpetuity = MonteCarloPerpetuity(100, time_frame, growth, 0.05)
+        benchmarks[f"Annuity.__init__[{time_frame}]"] = lambda periods=periods, time_frame=time_frame: Annuity(100, periods, time_frame, growth)
+        benchmarks[f"Annuity.get_present_value[{time_frame}]"] = lambda annuity=annuity: annuity.get_present_value(discount_rate)
+        benchmarks[f"Perpetuity.__init__[{time_frame}]"] = lambda time_frame=time_frame: Perpetuity(100, time_frame, growth)
+        benchmarks[f"Perpetuity.get_present_value[{time_frame}]"] = lambda perpetuity=perpetuity: perpetuity.get_present_value(discount_rate)
+        benchmarks[f"MonteCarloAnnuity.__init__[{time_frame}]"] = lambda periods=periods, time_frame=time_frame: MonteCarloAnnuity(100, periods, time_frame, growth, 0.05)
+        benchmarks[f"MonteCarloAnnuity.get_present_value[{time_frame}]"] = lambda mc_annuity=mc_annuity: mc_annuity.get_present_value(discount_rate)
+        benchmarks[f"MonteCarloAnnuity.simulate[{time_frame}]"] = lambda mc_annuity=mc_annuity: mc_annuity.simulate(discount_rate, 100, seed=0)
+        benchmarks[f"MonteCarloPerpetuity.__init__[{time_frame}]"] = lambda time_frame=time_frame: MonteCarloPerpetuity(100, time_frame, growth, 0.05)
+        benchmarks[f"MonteCarloPerpetuity.get_present_value[{time_frame}]"] = lambda mc_perpetuity=mc_perpetuity: mc_perpetuity.get_present_value(discount_rate)
+        benchmarks[f"MonteCarloPerpetuity.simulate[{time_frame}]"] = lambda mc_perpetuity=mc_perpetuity: mc_perpetuity.simulate(discount_rate, 100, seed=0)
+        benchmarks[f"payment_annuity[{time_frame}]"] = lambda periods=periods, time_frame=time_frame: payment_annuity(250000, InterestRate(0.045), periods, time_frame)
+    # the App flows, headless and without cached components
+    deterministic_deal = dict(benchmark_deal, non_receipt_chance=0)
+    benchmarks["main.App.calculate_present_value"] = lambda: DealModel(**deterministic_deal).present_value()
+    benchmarks["main.App.calculate_price_of_property"] = lambda: DealModel(**deterministic_deal).price_of_property()
+    benchmarks["new_main.App.calculate_present_value"] = lambda: DealModel(rent_trials=1000, seed=0, **benchmark_deal).present_value()
+    benchmarks["new_main.App.calculate_price_of_property"] = lambda: DealModel(rent_trials=1000, seed=0, **benchmark_deal).price_of_property()
+    return benchmarks
+
+
+def measure(function, repeat: int = 3) -> dict:
+    """
+    Measures the wall time, allocations and peak memory of a function.
+
+    Args:
+    - function (callable): the function to measure, called without arguments
+    - repeat (int): the number of timing runs, of which the fastest is kept
+
+    Returns:
+    - dict: the best wall time per call in seconds, the number of memory blocks and bytes still allocated after a call,
+      including its result, and the peak memory of a call in bytes
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat=repeat, number=number)) / number
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        start_size, _ = tracemalloc.get_traced_memory()
+        result = function()
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    differences = after.compare_to(before, "filename")
+    del result
+    return {
+        "seconds": seconds,
+        "allocated_blocks": sum(difference.count_diff for difference in differences if difference.count_diff > 0),
+        "allocated_bytes": sum(difference.size_diff for difference in differences if difference.size_diff > 0),
+        "peak_bytes": peak - start_size,
+    }
+
+
+def measure_cold_start(arguments: list, repeat: int = 10) -> dict:
+    """
+    Measures the cold start of the headless CLI, running it in a new interpreter each time.
+
+    Args:
+    - arguments (list of str): the command line arguments of cli.py
+    - repeat (int): the number of runs
+
+    Returns:
+    - dict: the fastest and median wall time of a run in seconds, including the start of the interpreter
+
+    Raises:
+    - subprocess.CalledProcessError: if the command fails
+    """
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py")] + arguments
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return {"seconds": min(times), "median_seconds": statistics.median(times)}
+
+
+def run(pattern: str = None, cold_start: bool = False) -> dict:
+    """
+    Runs the benchmark suite. Random draws are seeded so runs can be compared.
+
+    Args:
+    - pattern (str): only run the benchmarks whose name contains this text. None to run them all
+    - cold_start (bool): whether to also measure the cold start of the CLI commands
+
+    Returns:
+    - dict: the environment of the run, the measures of each benchmark by name, and the cold start of each CLI command
+      by name if measured
+    """
+    seed_random(0)
+    results = {}
+    for name, function in _benchmarks().items():
+        if pattern is None or pattern in name:
+            results[name] = measure(function)
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    cold_starts = {}
+    if cold_start:
+        cold_starts = {name: measure_cold_start(arguments) for name, arguments in cli_commands.items() if pattern is None or pattern in name}
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(), "benchmarks": results, "cold_start": cold_starts}
+
+
+def compare(baseline: dict, current: dict, threshold: float = regression_threshold) -> list:
+    """
+    Compares the wall times of two benchmark runs, including the cold starts measured in both.
+
+    Args:
+    - baseline (dict): the reference run, as returned by run
+    - current (dict): the new run, as returned by run
+    - threshold (float): the ratio of the baseline wall time above which a benchmark is a regression
+
+    Returns:
+    - list: the name, baseline seconds, current seconds, ratio and regression flag of each benchmark in both runs
+    """
+    comparison = []
+    for section in ("benchmarks", "cold_start"):
+        for name, measures in current.get(section, {}).items():
+            if name in baseline.get(section, {}):
+                reference = baseline[section][name]["seconds"]
+                ratio = measures["seconds"] / reference if reference else float("inf")
+                comparison.append((name, reference, measures["seconds"], ratio, ratio > threshold))
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the valuation classes.")
+    parser.add_argument("--filter", help="only run the benchmarks whose name contains this text")
+    parser.add_argument("--save", help="save the results as a baseline JSON file")
+    parser.add_argument("--compare", help="compare the results with a baseline JSON file")
+    parser.add_argument("--cold-start", action="store_true", help="also measure the cold start of the CLI commands")
+    arguments = parser.parse_args()
+    results = run(arguments.filter, arguments.cold_start)
+    print(f"{'benchmark':<48}{'time (us)':>14}{'blocks':>10}{'allocated':>14}{'peak':>14}")
+    for name, measures in results["benchmarks"].items():
+        print(f"{name:<48}{measures['seconds'] * 1e6:>14.1f}{measures['allocated_blocks']:>10}{measures['allocated_bytes']:>14}{measures['peak_bytes']:>14}")
+    for name, measures in results["cold_start"].items():
+        print(f"{name + ' (cold start)':<48}{measures['seconds'] * 1e6:>14.1f}  median {measures['median_seconds'] * 1e6:.1f}")
+    if arguments.save:
+        with open(arguments.save, "w") as file:
+            json.dump(results, file, indent=2)
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)
+        print(f"\nCompared with {baseline['commit']}:")
+        regressions = 0
+        for name, reference, seconds, ratio, regression in compare(baseline, results):
+            regressions += regression
+            print(f"{name:<48}{ratio:>8.2f}x{'  REGRESSION' if regression else ''}")
+        raise SystemExit(1 if regressions else 0)
@@ -1,10 +1,24 @@
+import functools
+
+import numpy as np
+
+import backends
+import instrumentation
+from instrumentation import timed
+
 time_frames = ["Y", "M", "W", "D"]
 time_frame_conversion = {"Y": 1, "M" :12, "W": 52, "D": 365}
 
+# maximum number of discount factor tables kept in memory, shared by every schedule
+discount_factor_cache_size = 32
+
 class InterestRate:
     """
     A class that represents an interest rate.
+    
+    Interest rates are immutable and hashable. Converted rates are memoized per target time frame.
     """
+    __slots__ = ("rate", "time_frame", "_converted_rates")
     
     def __init__(self, rate: float, time_frame: str = "Y") -> None:
         """
@@ -19,8 +33,29 @@ class InterestRate:
         """
         if time_frame not in time_frames:
             raise Exception("Time frame must be Y/M/W/D")
-        self.rate = rate
-        self.time_frame = time_frame
+        object.__setattr__(self, "rate", rate)
+        object.__setattr__(self, "time_frame", time_frame)
+        object.__setattr__(self, "_converted_rates", {time_frame: rate})
+        
+    def __setattr__(self, name, value):
+        raise AttributeError("InterestRate is immutable")
+    
+    def __delattr__(self, name):
+        raise AttributeError("InterestRate is immutable")
+    
+    def __reduce__(self):
+        return (InterestRate, (self.rate, self.time_frame))
+    
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, InterestRate):
+            return NotImplemented
+        return self.rate == other.rate and self.time_frame == other.time_frame
+    
+    def __hash__(self) -> int:
+        return hash((self.rate, self.time_frame))
+    
+    def __repr__(self) -> str:
+        return f"InterestRate({self.rate!r}, {self.time_frame!r})"
         
     def rate_in(self, target_time_frame: str) -> float:
         """
@@ -35,10 +70,58 @@ class InterestRate:
         Raises:
         - Exception: if target_time_frame is not one of "Y", "M", "W", "D"
         """
+        instrumentation.count("rate_in_calls")
+        try:
+            return self._converted_rates[target_time_frame]
+        except KeyError:
+            pass
         if target_time_frame not in time_frames:
             raise Exception("Time frame must be Y/M/W/D")
         target_rate = (1 + self.rate) ** (time_frame_conversion[self.time_frame]/time_frame_conversion[target_time_frame]) - 1
+        self._converted_rates[target_time_frame] = target_rate
         return target_rate
+    
+    def discount_factor(self, periods, time_frame: str):
+        """
+        Calculates the discount factor of cash flows receivable in a number of periods.
+        
+        Args:
+        - periods (float or array-like of float): the number of periods until receipt
+        - time_frame (str): the time frame of the periods. Must be one of "Y", "M", "W", "D"
+        
+        Returns:
+        - float or np.ndarray: the discount factor of each number of periods
+        
+        Raises:
+        - Exception: if time_frame is not one of "Y", "M", "W", "D"
+        """
+        if not isinstance(periods, (int, float)):
+            periods = np.asarray(periods, dtype=np.float64)
+        return (1 + self.rate_in(time_frame)) ** -periods
+    
+    def discount_factors(self, time_frame: str, horizon: int) -> np.ndarray:
+        """
+        Returns the cumulative discount factors of periods 0 to horizon in the given time frame.
+        The tables are kept in a bounded cache shared by every schedule discounting at the same rate, and are read-only.
+        
+        Args:
+        - time_frame (str): the time frame of the periods. Must be one of "Y", "M", "W", "D"
+        - horizon (int): the last period of the table
+        
+        Returns:
+        - np.ndarray: the discount factor of each period, starting at period 0
+        
+        Raises:
+        - Exception: if time_frame is not one of "Y", "M", "W", "D"
+        """
+        return _discount_factors(self.rate_in(time_frame), time_frame, int(horizon))
+
+
+@functools.lru_cache(maxsize=discount_factor_cache_size)
+def _discount_factors(rate: float, time_frame: str, horizon: int) -> np.ndarray:
+    factors = (1 + rate) ** -np.arange(horizon + 1, dtype=np.float64)
+    factors.flags.writeable = False
+    return factors
             
 
 class CashFlow:
@@ -59,6 +142,7 @@ class CashFlow:
         """
         if time_frame not in time_frames:
             raise Exception("Time frame must be Y/M/W/D")
+        instrumentation.count("cash_flows_built")
         self.amount = amount
         self.receivable_in = receivable_in
         self.time_frame  = time_frame
@@ -72,12 +156,130 @@ class CashFlow:
         Returns:
         - float: the present value of the cash flow
         """
-        present_value = self.amount / (1 + discount_rate.rate_in(self.time_frame)) ** (self.receivable_in)
+        instrumentation.count("cash_flows_discounted")
+        present_value = self.amount * discount_rate.discount_factor(self.receivable_in, self.time_frame)
         return present_value
 
+class CashFlowSchedule:
+    """
+    A class that represents a schedule of cash flows stored as contiguous arrays of amounts and periods.
+    
+    Unlike an Annuity, the periods do not have to be regular, so capex spikes or lease step-ups can be expressed.
+    """
+    def __init__(self, amounts, periods, time_frame: str = "Y") -> None:
+        """
+        Initializes a CashFlowSchedule object with the amounts, the number of periods until receipt of each amount, and a time frame.
+        
+        Args:
+        - amounts (array-like of float): the amount of each cash flow
+        - periods (array-like of float): the number of periods until receipt of each cash flow
+        - time_frame (str): the time frame of the periods. Must be one of "Y", "M", "W", "D"
+        
+        Raises:
+        - Exception: if time_frame is not one of "Y", "M", "W", "D"
+        - ValueError: if amounts and periods are not one-dimensional arrays of the same length
+        """
+        if time_frame not in time_frames:
+            raise Exception("Time frame must be Y/M/W/D")
+        amounts = np.ascontiguousarray(amounts, dtype=np.float64)
+        periods = np.ascontiguousarray(periods, dtype=np.float64)
+        if amounts.ndim != 1 or amounts.shape != periods.shape:
+            raise ValueError("Amounts and periods must be one-dimensional and of the same length")
+        self.amounts = amounts
+        self.periods = periods
+        self.time_frame = time_frame
+        # whole, non-negative periods are discounted with the shared discount factor tables
+        self._period_indices = None
+        if len(periods) and periods.min() >= 0 and np.array_equal(periods, np.floor(periods)):
+            self._period_indices = periods.astype(np.intp)
+        
+    @classmethod
+    def from_annuity(cls, annuity) -> "CashFlowSchedule":
+        """
+        Creates a schedule holding the cash flows of an Annuity, a Perpetuity or a MonteCarloAnnuity.
+        For a MonteCarloAnnuity the schedule holds the amounts due, before any of them is zeroed.
+        
+        Args:
+        - annuity (Annuity): the annuity to convert
+        
+        Returns:
+        - CashFlowSchedule: the schedule of the annuity's cash flows
+        """
+        periods = np.arange(1, annuity.payments + 1, dtype=np.float64)
+        amounts = backends.active.growing_annuity(annuity.amount, annuity.cash_flow_growth.rate_in(annuity.time_frame), annuity.payments)
+        return cls(amounts, periods, annuity.time_frame)
+    
+    @classmethod
+    def from_cash_flows(cls, cash_flows, time_frame: str = "Y") -> "CashFlowSchedule":
+        """
+        Creates a schedule from CashFlow objects. Cash flows in another time frame are moved to the schedule's time frame.
+        
+        Args:
+        - cash_flows (iterable of CashFlow): the cash flows to put in the schedule
+        - time_frame (str): the time frame of the schedule. Must be one of "Y", "M", "W", "D"
+        
+        Returns:
+        - CashFlowSchedule: the schedule of the cash flows
+        """
+        amounts = []
+        periods = []
+        for cash_flow in cash_flows:
+            amounts.append(cash_flow.amount)
+            periods.append(cash_flow.receivable_in * time_frame_conversion[time_frame] / time_frame_conversion[cash_flow.time_frame])
+        return cls(amounts, periods, time_frame)
+    
+    def __len__(self) -> int:
+        return len(self.amounts)
+    
+    def __iter__(self):
+        for amount, period in zip(self.amounts.tolist(), self.periods.tolist()):
+            yield CashFlow(amount, period, self.time_frame)
+            
+    def __add__(self, other: "CashFlowSchedule") -> "CashFlowSchedule":
+        """
+        Combines two schedules into one. The other schedule is moved to this schedule's time frame.
+        """
+        periods = other.periods * time_frame_conversion[self.time_frame] / time_frame_conversion[other.time_frame]
+        return CashFlowSchedule(np.concatenate((self.amounts, other.amounts)), np.concatenate((self.periods, periods)), self.time_frame)
+    
+    def discount_factors(self, discount_rate: InterestRate) -> np.ndarray:
+        """
+        Calculates the discount factor of each cash flow of the schedule.
+        
+        Args:
+        - discount_rate (InterestRate): the discount rate to use
+        
+        Returns:
+        - np.ndarray: the discount factor of each cash flow
+        """
+        if self._period_indices is None:
+            return discount_rate.discount_factor(self.periods, self.time_frame)
+        return discount_rate.discount_factors(self.time_frame, self._period_indices.max())[self._period_indices]
+        
+    @timed
+    def get_present_value(self, discount_rate: InterestRate) -> float:
+        """
+        Calculates the present value of the schedule using the given discount rate. Whole periods are discounted with the
+        shared discount factor tables, and other periods at a flat rate with the discount_schedule kernel of the active backend.
+        
+        Args:
+        - discount_rate (InterestRate): the discount rate to use for calculating the present value
+        
+        Returns:
+        - float: the present value of the schedule
+        """
+        instrumentation.count("cash_flows_discounted", len(self))
+        if self._period_indices is None and isinstance(discount_rate, InterestRate):
+            return round(backends.active.discount_schedule(self.amounts, self.periods, discount_rate.rate_in(self.time_frame)), 2)
+        return round(float(self.amounts @ self.discount_factors(discount_rate)), 2)
+    
 class Annuity:
     """
     A class that represents an annuity.
+    
+    Only the amount, growth, number of payments and time frame are stored. The present value is
+    priced with the growing-annuity formula and the individual cash flows are only built when the
+    annuity is iterated over.
     """
     def __init__(self, amount: float, payments: float, time_frame: str = "Y", cash_flow_growth: InterestRate = InterestRate(0)) -> None:
         """
@@ -96,10 +298,30 @@ class Annuity:
         self.amount = amount
         self.payments = payments
         self.time_frame = time_frame
-        self.cash_flows = []
-        for n in range(1, payments + 1): 
-            self.cash_flows.append(CashFlow(self.amount * (1 + cash_flow_growth.rate_in(time_frame)) ** n, n, time_frame))
+        self.cash_flow_growth = cash_flow_growth
+        
+    def __len__(self) -> int:
+        return self.payments
+    
+    def __iter__(self):
+        """
+        Builds the cash flows of the annuity one at a time.
+        
+        Yields:
+        - CashFlow: the cash flow of each period, starting at period 1
+        """
+        growth = 1 + self.cash_flow_growth.rate_in(self.time_frame)
+        for n in range(1, self.payments + 1):
+            yield CashFlow(self.amount * growth ** n, n, self.time_frame)
+    
+    @property
+    def cash_flows(self) -> list:
+        """
+        Materializes every cash flow of the annuity. Prefer iterating over the annuity directly.
+        """
+        return list(self)
             
+    @timed
     def get_present_value(self, discount_rate: InterestRate) -> float:
         """
         Calculates the present value of the annuity using the given discount rate.
@@ -110,15 +332,19 @@ class Annuity:
         Returns:
         - float: the present value of the annuity
         """
-        sum_present_value = 0
-        for n in self.cash_flows:
-            sum_present_value += n.get_present_value(discount_rate)
-                
-        return round(sum_present_value, 2)
+        if not isinstance(discount_rate, InterestRate):
+            # the growing-annuity formula needs a flat rate, other discount curves value the cash flows as a schedule
+            return CashFlowSchedule.from_annuity(self).get_present_value(discount_rate)
+        instrumentation.count("closed_form_valuations")
+        factor = growing_annuity_factor(discount_rate.rate_in(self.time_frame), self.cash_flow_growth.rate_in(self.time_frame), self.payments)
+        return round(self.amount * factor, 2)
     
 class Perpetuity(Annuity):
     """
     A class that represents a perpetuity.
+    
+    The present value uses the growing-perpetuity formula. Iterating over a perpetuity stops after
+    1000 years of cash flows, which is also the horizon perpetuities are valued over with a discount curve.
     """
     def __init__(self, amount: float, time_frame: str = "Y", cash_flow_growth: InterestRate = InterestRate(0)) -> None:
         """
@@ -132,7 +358,7 @@ class Perpetuity(Annuity):
         """
         super().__init__(amount, 1000 * time_frame_conversion[time_frame], time_frame, cash_flow_growth= cash_flow_growth)
         
-    # Overriding the get_present_value method to mention it is for perpetuity
+    @timed
     def get_present_value(self, discount_rate: InterestRate) -> float:
         """
         Calculates the present value of the perpetuity using the given discount rate.
@@ -142,10 +368,72 @@ class Perpetuity(Annuity):
         
         Returns:
         - float: the present value of the perpetuity
+        
+        Raises:
+        - ValueError: if the cash flows grow at least as fast as the discount rate, or as the long-end rate of a discount curve
         """
-        return super().get_present_value(discount_rate)
+        _check_perpetuity_converges(self.cash_flow_growth, discount_rate, self.time_frame)
+        if not isinstance(discount_rate, InterestRate):
+            # the cash flows are valued as a schedule truncated after the 1000 years the perpetuity iterates over
+            return CashFlowSchedule.from_annuity(self).get_present_value(discount_rate)
+        instrumentation.count("closed_form_valuations")
+        factor = growing_annuity_factor(discount_rate.rate_in(self.time_frame), self.cash_flow_growth.rate_in(self.time_frame))
+        return round(self.amount * factor, 2)
+
+
+def _check_perpetuity_converges(cash_flow_growth: InterestRate, discount_rate, time_frame: str) -> None:
+    # a perpetuity has a finite value only if its cash flows grow slower than the discount rate, which for a discount
+    # curve is the rate of its long end. Truncated schedules would otherwise return a large but finite value
+    if isinstance(discount_rate, InterestRate):
+        diverges = cash_flow_growth.rate_in(time_frame) >= discount_rate.rate_in(time_frame)
+    else:
+        long_end_rate = getattr(discount_rate, "long_end_rate", None)
+        diverges = long_end_rate is not None and cash_flow_growth.rate_in("Y") >= long_end_rate
+    if diverges:
+        raise ValueError("Perpetuity does not converge: growth must be lower than the discount rate")
 
 
+def convert_rate(rate, time_frame: str, target_time_frame: str):
+    """
+    Converts interest rates from one time frame to another. Works element-wise on arrays of rates.
+    
+    Args:
+    - rate (float or array-like of float): the interest rates in time_frame
+    - time_frame (str): the time frame of the rates. Must be one of "Y", "M", "W", "D"
+    - target_time_frame (str): the target time frame. Must be one of "Y", "M", "W", "D"
+    
+    Raises:
+    - Exception: if time_frame or target_time_frame is not one of "Y", "M", "W", "D"
+    
+    Returns: the interest rates in the target time frame
+    """
+    if time_frame not in time_frames or target_time_frame not in time_frames:
+        raise Exception("Time frame must be Y/M/W/D")
+    return (1 + np.asarray(rate, dtype=np.float64)) ** (time_frame_conversion[time_frame]/time_frame_conversion[target_time_frame]) - 1
+
+
+def growing_annuity_factor(discount_rate, growth_rate, number_periods=None):
+    """
+    Calculates the present value of a growing annuity paying 1 * (1 + growth_rate) ** n at the end of each period n.
+    Works element-wise on arrays of rates and numbers of periods.
+    
+    Args:
+    - discount_rate (float or array-like of float): the discount rate per period
+    - growth_rate (float or array-like of float): the growth rate of the cash flows per period
+    - number_periods (int or array-like of int): the number of payments. None for a perpetuity
+    
+    Returns: the present value of the growing annuity. nan for a perpetuity whose growth is not lower than the discount rate
+    """
+    discount_rate = np.asarray(discount_rate, dtype=np.float64)
+    # ratio between two consecutive discounted cash flows is 1 + step
+    step = (growth_rate - discount_rate) / (1 + discount_rate)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if number_periods is None:
+            factor = np.where(step < 0, (1 + step) / -step, np.nan)
+        else:
+            factor = np.where(step == 0, number_periods, (1 + step) * np.expm1(number_periods * np.log1p(step)) / step)
+    return float(factor) if factor.ndim == 0 else factor
+
 
 def payment_annuity(present_value: float, InterestRate: InterestRate, number_periods: int, time_frame: str="Y") -> float:
     """
@@ -164,5 +452,9 @@ def payment_annuity(present_value: float, InterestRate: InterestRate, number_per
     """
     if time_frame not in time_frames:
             raise Exception("Time frame must be Y/M/W/D")
-    payment = (InterestRate.rate_in(time_frame) * present_value) / (1 - (1 + InterestRate.rate_in(time_frame)) ** -number_periods)
+    rate = InterestRate.rate_in(time_frame)
+    if rate == 0:
+        # without interest the present value is repaid in equal parts
+        return present_value / number_periods
+    payment = (rate * present_value) / (1 - (1 + rate) ** -number_periods)
     return payment
@@ -0,0 +1,164 @@
+"""
+Values real estate deals from the command line, with JSON output and without the Tk apps.
+
+Modules are imported inside the commands, so each command only loads what it needs: a plain deal loads NumPy and
+the vectorized deal valuation, and the Monte Carlo engine, yield curves and valuation cache are only loaded when used.
+
+Examples:
+    python cli.py present-value --property-price 300000 --down-payment 50000 --discount-rate 0.06 --mortgage-rate 0.045 --mortgage-length 25 --rent-amount 2000
+    python cli.py price --down-payment 50000 --discount-rate "1:0.05, 30:0.06" --mortgage-rate 0.045 --mortgage-length 25 --rent-amount 2000
+    python cli.py simulate --property-price 300000 ... --non-receipt-chance 0.05 --trials 100000 --seed 1 --percentiles 5 50 95
+"""
+import argparse
+import json
+import math
+import sys
+
+# deal inputs of each command, as in deal_valuation.deal_inputs, which is not imported to keep the start fast
+deal_options = ["property_price", "down_payment", "discount_rate", "mortgage_rate", "mortgage_length", "rent_amount", "non_receipt_chance", "rent_growth", "maintenance_cost", "costs_growth"]
+
+# deal inputs that may be left out, as in deal_model.default_deal_inputs
+optional_deal_options = {"non_receipt_chance": 0.0, "rent_growth": 0.0, "maintenance_cost": 0.0, "costs_growth": 0.0}
+
+
+def _deal_inputs(arguments: argparse.Namespace, names: list) -> dict:
+    inputs = {name: getattr(arguments, name) for name in names}
+    if ":" in inputs["discount_rate"]:
+        from yield_curve import YieldCurve
+        inputs["discount_rate"] = YieldCurve.parse(inputs["discount_rate"])
+    else:
+        inputs["discount_rate"] = float(inputs["discount_rate"])
+    return inputs
+
+
+def _deal_model(arguments: argparse.Namespace, inputs: dict, rent_trials: int = None, seed: int = None):
+    from deal_model import DealModel
+    cache = None
+    if arguments.cache is not None:
+        from valuation_cache import ValuationCache
+        cache = ValuationCache(arguments.cache)
+    return DealModel(rent_trials=rent_trials, seed=seed, cache=cache, **inputs)
+
+
+def _needs_deal_model(arguments: argparse.Namespace, inputs: dict) -> bool:
+    # the vectorized deal valuation only takes flat discount rates, and has no cache
+    return arguments.cache is not None or not isinstance(inputs["discount_rate"], float)
+
+
+def _check_finite(result) -> None:
+    # JSON has no NaN or infinity, which the vectorized valuation returns for deals whose rent or costs grow too fast
+    values = result.values() if isinstance(result, dict) else [result]
+    for value in values:
+        if isinstance(value, dict):
+            _check_finite(value)
+        elif isinstance(value, float) and not math.isfinite(value):
+            raise ValueError("The deal has no finite value: the rent or costs grow at least as fast as the discount rate")
+
+
+def present_value(arguments: argparse.Namespace) -> dict:
+    """
+    Values a deal like App.calculate_present_value.
+
+    Args:
+    - arguments (argparse.Namespace): the parsed command line
+
+    Returns:
+    - dict: the present value of the deal
+    """
+    inputs = _deal_inputs(arguments, deal_options)
+    if _needs_deal_model(arguments, inputs):
+        model = _deal_model(arguments, inputs)
+        return {"present_value": model.present_value(), "components": model.components()}
+    from deal_valuation import present_value_of_deals
+    return {"present_value": float(present_value_of_deals(**inputs))}
+
+
+def price(arguments: argparse.Namespace) -> dict:
+    """
+    Calculates the maximum price of property of a deal like App.calculate_price_of_property.
+
+    Args:
+    - arguments (argparse.Namespace): the parsed command line
+
+    Returns:
+    - dict: the maximum price of property
+    """
+    inputs = _deal_inputs(arguments, deal_options[1:])
+    if _needs_deal_model(arguments, inputs):
+        return {"price_of_property": _deal_model(arguments, inputs).price_of_property()}
+    from deal_valuation import price_of_property_of_deals
+    return {"price_of_property": float(price_of_property_of_deals(**inputs))}
+
+
+def simulate(arguments: argparse.Namespace) -> dict:
+    """
+    Values a deal with a Monte Carlo simulation of the rent, like new_main.App.calculate_present_value.
+
+    Args:
+    - arguments (argparse.Namespace): the parsed command line
+
+    Returns:
+    - dict: the number of trials, the mean present value of the deal and its percentiles
+    """
+    model = _deal_model(arguments, _deal_inputs(arguments, deal_options), arguments.trials, arguments.seed)
+    percentiles = model.present_value_percentile(arguments.percentiles)
+    return {
+        "trials": arguments.trials,
+        "present_value": model.present_value(),
+        "percentiles": {f"{q:g}": float(value) for q, value in zip(arguments.percentiles, percentiles)},
+    }
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Value real estate deals, printing the results as JSON.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, function, help_text in (("present-value", present_value, "present value of a deal"),
+                                      ("price", price, "maximum price of property of a deal"),
+                                      ("simulate", simulate, "present value of a deal over a Monte Carlo simulation of the rent")):
+        command = commands.add_parser(name, help=help_text)
+        command.set_defaults(function=function)
+        for option in deal_options:
+            if name == "price" and option == "property_price":
+                continue
+            flag = "--" + option.replace("_", "-")
+            if option == "discount_rate":
+                command.add_argument(flag, required=True, help="yearly discount rate, or a yield curve as tenor:rate points")
+            elif option == "mortgage_length":
+                command.add_argument(flag, type=int, required=True, help="length of the mortgage in whole years")
+            elif option in optional_deal_options:
+                command.add_argument(flag, type=float, default=optional_deal_options[option])
+            else:
+                command.add_argument(flag, type=float, required=True)
+        command.add_argument("--cache", help="SQLite file of a valuation cache shared between runs")
+        if name == "simulate":
+            command.add_argument("--trials", type=int, default=10000, help="number of trials")
+            command.add_argument("--seed", type=int, help="seed of the simulation, which makes it repeatable and cacheable")
+            command.add_argument("--percentiles", type=float, nargs="+", default=[5, 50, 95], help="percentiles of the present value to report")
+    return parser
+
+
+def main(argv: list = None) -> int:
+    """
+    Runs a command and prints its result as JSON on stdout, or the error as JSON on stderr.
+
+    Args:
+    - argv (list of str): the command line arguments. None for sys.argv
+
+    Returns:
+    - int: the exit code, 0 on success and 1 if the deal could not be valued or has no finite value
+    """
+    arguments = _parser().parse_args(argv)
+    try:
+        result = arguments.function(arguments)
+        _check_finite(result)
+    except (ValueError, ZeroDivisionError, ImportError) as error:
+        json.dump({"error": str(error)}, sys.stderr)
+        sys.stderr.write("\n")
+        return 1
+    json.dump(result, sys.stdout)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
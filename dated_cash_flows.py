@@ -0,0 +1,202 @@
+import numpy as np
+
+from cash_flows import *
+
+# day-count conventions used to turn dates into year fractions
+day_counts = ["ACT/365", "30/360"]
+
+
+def _dates(values) -> np.ndarray:
+    return np.asarray(values, dtype="datetime64[D]")
+
+
+def _calendar(dates: np.ndarray) -> tuple:
+    # year, month (1 to 12) and day of the month (1 to 31) of each date
+    months = dates.astype("datetime64[M]")
+    years = months.astype("datetime64[Y]").astype(np.int64) + 1970
+    return years, months.astype(np.int64) % 12 + 1, (dates - months.astype("datetime64[D]")).astype(np.int64) + 1
+
+
+def add_months(dates, months) -> np.ndarray:
+    """
+    Moves dates by whole months, keeping the day of the month or the last day of shorter months.
+
+    Args:
+    - dates (date or array-like of dates): the dates to move, as datetime64, datetime.date or ISO strings
+    - months (int or array-like of int): the number of months to move each date by
+
+    Returns:
+    - np.ndarray: the moved dates, as datetime64[D]
+    """
+    dates = _dates(dates)
+    month_starts = dates.astype("datetime64[M]")
+    days = (dates - month_starts.astype("datetime64[D]")).astype(np.int64)
+    target = month_starts + np.asarray(months, dtype=np.int64)
+    month_lengths = ((target + 1).astype("datetime64[D]") - target.astype("datetime64[D]")).astype(np.int64)
+    return target.astype("datetime64[D]") + np.minimum(days, month_lengths - 1)
+
+
+def year_fraction(start, end, day_count: str = "ACT/365"):
+    """
+    Calculates the year fraction between dates under a day-count convention, for whole arrays of dates at once.
+
+    Conventions:
+    - ACT/365: the actual number of days, over 365
+    - 30/360: every month counts 30 days and the year 360 (bond basis). A day 31 counts as 30, and so does an end day 31
+      when the start day is 30 or 31
+
+    Args:
+    - start (date or array-like of dates): the start dates, as datetime64, datetime.date or ISO strings
+    - end (date or array-like of dates): the end dates
+    - day_count (str): the day-count convention. Must be one of "ACT/365", "30/360"
+
+    Returns:
+    - float or np.ndarray: the year fraction from each start date to each end date, negative if the end is before the start
+
+    Raises:
+    - ValueError: if day_count is unknown
+    """
+    if day_count not in day_counts:
+        raise ValueError("Day count must be ACT/365 or 30/360")
+    start, end = _dates(start), _dates(end)
+    if day_count == "ACT/365":
+        fractions = (end - start).astype(np.int64) / 365
+    else:
+        start_years, start_months, start_days = _calendar(start)
+        end_years, end_months, end_days = _calendar(end)
+        start_days = np.minimum(start_days, 30)
+        end_days = np.where((end_days == 31) & (start_days == 30), 30, end_days)
+        fractions = (360 * (end_years - start_years) + 30 * (end_months - start_months) + (end_days - start_days)) / 360
+    return float(fractions) if np.ndim(fractions) == 0 else fractions
+
+
+def payment_dates(start, payments: int, time_frame: str = "M") -> np.ndarray:
+    """
+    Lays out regular payment dates on the calendar, one period apart: 12 months for "Y", one month for "M", 7 days for "W"
+    and one day for "D". The first payment is one period after the start, as period 1 of an Annuity.
+
+    Args:
+    - start (date): the start date, as datetime64, datetime.date or an ISO string
+    - payments (int): the number of payments
+    - time_frame (str): the time between payments. Must be one of "Y", "M", "W", "D"
+
+    Returns:
+    - np.ndarray: the date of each payment, as datetime64[D]
+
+    Raises:
+    - Exception: if time_frame is not one of "Y", "M", "W", "D"
+    """
+    if time_frame not in time_frames:
+        raise Exception("Time frame must be Y/M/W/D")
+    periods = np.arange(1, payments + 1)
+    if time_frame in ("Y", "M"):
+        return add_months(start, periods * (12 if time_frame == "Y" else 1))
+    return _dates(start) + periods * (7 if time_frame == "W" else 1)
+
+
+class DatedCashFlowSchedule:
+    """
+    A class that represents a schedule of cash flows paid on calendar dates, stored as arrays of amounts and datetime64 dates.
+
+    Each cash flow is discounted over the year fraction from the valuation date to its payment date, so schedules of
+    different frequencies, such as monthly rent, yearly maintenance and weekly short-let income, are aligned on real
+    dates. The year fractions and discount factors of a whole schedule are calculated in one array operation.
+    """
+    def __init__(self, amounts, dates, valuation_date, day_count: str = "ACT/365") -> None:
+        """
+        Initializes a DatedCashFlowSchedule object with the amounts, their payment dates, the valuation date and the day-count convention.
+
+        Args:
+        - amounts (array-like of float): the amount of each cash flow
+        - dates (array-like of dates): the payment date of each cash flow, as datetime64, datetime.date or ISO strings
+        - valuation_date (date): the date the schedule is valued at
+        - day_count (str): the day-count convention. Must be one of "ACT/365", "30/360"
+
+        Raises:
+        - ValueError: if amounts and dates are not one-dimensional arrays of the same length, a cash flow is paid before
+          the valuation date, or day_count is unknown
+        """
+        if day_count not in day_counts:
+            raise ValueError("Day count must be ACT/365 or 30/360")
+        amounts = np.ascontiguousarray(amounts, dtype=np.float64)
+        dates = np.ascontiguousarray(_dates(dates))
+        if amounts.ndim != 1 or amounts.shape != dates.shape:
+            raise ValueError("Amounts and dates must be one-dimensional and of the same length")
+        valuation_date = _dates(valuation_date)
+        if len(dates) and dates.min() < valuation_date:
+            raise ValueError("Cash flows must not be paid before the valuation date")
+        self.amounts = amounts
+        self.dates = dates
+        self.valuation_date = valuation_date
+        self.day_count = day_count
+
+    @classmethod
+    def from_annuity(cls, annuity, start, valuation_date=None, day_count: str = "ACT/365") -> "DatedCashFlowSchedule":
+        """
+        Creates a dated schedule holding the cash flows of an Annuity, a Perpetuity or a MonteCarloAnnuity, paid on the
+        calendar from a start date. The growth of the amounts is the same as in the annuity.
+
+        Args:
+        - annuity (Annuity): the annuity to convert
+        - start (date): the start of the annuity, one period before its first payment
+        - valuation_date (date): the date the schedule is valued at. None for the start date
+        - day_count (str): the day-count convention. Must be one of "ACT/365", "30/360"
+
+        Returns:
+        - DatedCashFlowSchedule: the dated schedule of the annuity's cash flows
+        """
+        schedule = CashFlowSchedule.from_annuity(annuity)
+        return cls(schedule.amounts, payment_dates(start, annuity.payments, annuity.time_frame), start if valuation_date is None else valuation_date, day_count)
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def __add__(self, other: "DatedCashFlowSchedule") -> "DatedCashFlowSchedule":
+        """
+        Combines two schedules valued at the same date with the same day-count convention into one.
+
+        Raises:
+        - ValueError: if the schedules do not share the valuation date and day-count convention
+        """
+        if self.valuation_date != other.valuation_date or self.day_count != other.day_count:
+            raise ValueError("Only schedules with the same valuation date and day count can be combined")
+        return DatedCashFlowSchedule(np.concatenate((self.amounts, other.amounts)), np.concatenate((self.dates, other.dates)), self.valuation_date, self.day_count)
+
+    @property
+    def year_fractions(self) -> np.ndarray:
+        return year_fraction(self.valuation_date, self.dates, self.day_count)
+
+    def to_schedule(self) -> CashFlowSchedule:
+        """
+        Converts the dated schedule to a CashFlowSchedule in years, receivable after the year fraction of each date.
+
+        Returns:
+        - CashFlowSchedule: the schedule, with periods in years
+        """
+        return CashFlowSchedule(self.amounts, self.year_fractions, "Y")
+
+    def discount_factors(self, discount_rate: InterestRate) -> np.ndarray:
+        """
+        Calculates the discount factor of each cash flow of the schedule over its year fraction.
+
+        Args:
+        - discount_rate (InterestRate or YieldCurve): the discount rate to use
+
+        Returns:
+        - np.ndarray: the discount factor of each cash flow
+        """
+        return np.asarray(discount_rate.discount_factor(self.year_fractions, "Y"))
+
+    @timed
+    def get_present_value(self, discount_rate: InterestRate) -> float:
+        """
+        Calculates the present value of the schedule at the valuation date using the given discount rate.
+
+        Args:
+        - discount_rate (InterestRate or YieldCurve): the discount rate to use for calculating the present value
+
+        Returns:
+        - float: the present value of the schedule
+        """
+        instrumentation.count("cash_flows_discounted", len(self))
+        return round(float(self.amounts @ self.discount_factors(discount_rate)), 2)
@@ -0,0 +1,207 @@
+import threading
+from collections import OrderedDict
+
+from mc_cash_flow import *
+from valuation_cache import ValuationCache, canonical_key
+
+# maximum number of present values cached for each component
+component_cache_size = 128
+
+# inputs that may be left out, with the value used instead
+default_deal_inputs = {"non_receipt_chance": 0.0, "rent_growth": 0.0, "maintenance_cost": 0.0, "costs_growth": 0.0}
+
+
+def _discount_rate(value):
+    # discount rates are yearly decimals, or discount curves such as a YieldCurve
+    return value if hasattr(value, "discount_factors") else InterestRate(value)
+
+
+class DealModel:
+    """
+    A class that represents a real estate deal valued like the App: a monthly mortgage annuity, a yearly maintenance
+    perpetuity and a monthly rent perpetuity.
+
+    The present value of each component is cached on the inputs it depends on, so changing the rent does not re-price
+    the mortgage and changing the mortgage rate does not re-price the rent. With a ValuationCache, the present values
+    are also kept on disk and reused by later runs, except simulations of the rent without a seed.
+    """
+    # inputs each component depends on
+    mortgage_inputs = ("property_price", "down_payment", "discount_rate", "mortgage_rate", "mortgage_length")
+    maintenance_inputs = ("discount_rate", "maintenance_cost", "costs_growth")
+    rent_inputs = ("discount_rate", "rent_amount", "non_receipt_chance", "rent_growth")
+
+    def __init__(self, rent_trials: int = None, seed=None, cache: ValuationCache = None, **inputs) -> None:
+        """
+        Initializes a DealModel object with the number of Monte Carlo trials used for the rent and the deal inputs.
+
+        Args:
+        - rent_trials (int): the number of trials used to simulate the rent. None to value the rent at its expected value
+        - seed (int): the seed of the rent simulations. None for a random seed
+        - cache (ValuationCache): the persistent cache of the component present values. None to only cache them in memory
+        - **inputs: the deal inputs, as in present_value_of_deals. Rates are yearly decimals and the mortgage length is in years.
+          The discount rate can also be a YieldCurve
+
+        Raises:
+        - TypeError: if an input is unknown
+        """
+        self.rent_trials = rent_trials
+        self.seed = seed
+        self.cache = cache
+        self.inputs = dict(default_deal_inputs)
+        self._caches = {"mortgage": OrderedDict(), "maintenance": OrderedDict(), "rent": OrderedDict()}
+        self._lock = threading.Lock()
+        self.update(**inputs)
+
+    def update(self, **inputs) -> None:
+        """
+        Changes some of the deal inputs. Components whose inputs did not change keep their cached present value.
+
+        Args:
+        - **inputs: the deal inputs to change
+
+        Raises:
+        - TypeError: if an input is unknown
+        """
+        unknown = set(inputs) - set(self.mortgage_inputs + self.maintenance_inputs + self.rent_inputs)
+        if unknown:
+            raise TypeError(f"Unknown deal inputs: {', '.join(sorted(unknown))}")
+        self.inputs.update(inputs)
+
+    def _key(self, inputs: dict, names: tuple) -> tuple:
+        missing = [name for name in names if name not in inputs]
+        if missing:
+            raise ValueError(f"Missing deal inputs: {', '.join(missing)}")
+        return tuple(inputs[name] for name in names)
+
+    def _cached(self, component: str, key: tuple, calculate, persistent: bool = True):
+        cache = self._caches[component]
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        if self.cache is not None and persistent:
+            value = self.cache.get_or_compute(canonical_key(f"DealModel.{component}", key=key), calculate)
+        else:
+            value = calculate()
+        with self._lock:
+            cache[key] = value
+            if len(cache) > component_cache_size:
+                cache.popitem(last=False)
+        return value
+
+    def _mortgage(self, inputs: dict) -> float:
+        key = self._key(inputs, self.mortgage_inputs)
+
+        def calculate() -> float:
+            property_price, down_payment, discount_rate, mortgage_rate, mortgage_length = key
+            number_periods_mortgage = int(mortgage_length) * 12
+            mortgage_payment = payment_annuity(property_price - down_payment, InterestRate(mortgage_rate), number_periods_mortgage, time_frame="M")
+            return Annuity(-mortgage_payment, number_periods_mortgage, time_frame="M").get_present_value(_discount_rate(discount_rate))
+
+        return self._cached("mortgage", key, calculate)
+
+    def _maintenance(self, inputs: dict) -> float:
+        key = self._key(inputs, self.maintenance_inputs)
+
+        def calculate() -> float:
+            discount_rate, maintenance_cost, costs_growth = key
+            return Perpetuity(-maintenance_cost, cash_flow_growth=InterestRate(costs_growth)).get_present_value(_discount_rate(discount_rate))
+
+        return self._cached("maintenance", key, calculate)
+
+    def _rent(self, inputs: dict, progress=None):
+        key = self._key(inputs, self.rent_inputs) + (self.rent_trials, self.seed)
+
+        def calculate():
+            discount_rate, rent_amount, non_receipt_chance, rent_growth = key[:4]
+            if self.rent_trials is None or non_receipt_chance == 0:
+                return (1 - non_receipt_chance) * Perpetuity(rent_amount, time_frame="M", cash_flow_growth=InterestRate(rent_growth)).get_present_value(_discount_rate(discount_rate))
+            rent = MonteCarloPerpetuity(rent_amount, time_frame="M", cash_flow_growth=InterestRate(rent_growth), chance_of_zero=non_receipt_chance)
+            return rent.simulate(_discount_rate(discount_rate), self.rent_trials, seed=self.seed, progress=progress)
+
+        simulated = self.rent_trials is not None and key[2] != 0
+        return self._cached("rent", key, calculate, persistent=not simulated or self.seed is not None)
+
+    def components(self, progress=None) -> dict:
+        """
+        Calculates the present value of each component of the deal, reusing the cached ones.
+
+        Args:
+        - progress (callable): called with the fraction of the rent simulation done, if the rent has to be simulated
+
+        Returns:
+        - dict: the present value of the down payment, mortgage, maintenance and rent. The rent is the mean of its simulation
+
+        Raises:
+        - ValueError: if an input the components depend on is missing
+        """
+        return self._components(dict(self.inputs), progress)
+
+    def _components(self, inputs: dict, progress=None) -> dict:
+        rent = self._rent(inputs, progress)
+        return {
+            "down_payment": -self._key(inputs, ("down_payment",))[0],
+            "mortgage": self._mortgage(inputs),
+            "maintenance": self._maintenance(inputs),
+            "rent": rent.mean if isinstance(rent, SimulationResult) else rent,
+        }
+
+    def present_value(self, progress=None) -> float:
+        """
+        Calculates the present value of the deal.
+
+        Args:
+        - progress (callable): called with the fraction of the rent simulation done, if the rent has to be simulated
+
+        Returns:
+        - float: the present value of the deal
+
+        Raises:
+        - ValueError: if an input is missing
+        """
+        return sum(self.components(progress).values())
+
+    def present_value_percentile(self, q, progress=None):
+        """
+        Calculates percentiles of the present value of the deal over the rent simulation.
+
+        Args:
+        - q (float or array-like of float): the percentiles to calculate, between 0 and 100
+        - progress (callable): called with the fraction of the rent simulation done, if the rent has to be simulated
+
+        Returns:
+        - float or np.ndarray: the present value at each percentile. The present value itself if the rent is not simulated
+
+        Raises:
+        - ValueError: if an input is missing
+        """
+        # one snapshot of the inputs, so a concurrent update does not mix old and new inputs in the result
+        inputs = dict(self.inputs)
+        components = self._components(inputs, progress)
+        rent = self._rent(inputs)
+        if not isinstance(rent, SimulationResult):
+            present_value = sum(components.values())
+            return present_value if np.ndim(q) == 0 else np.full(np.shape(q), present_value)
+        return sum(components.values()) - components["rent"] + rent.percentile(q)
+
+    def price_of_property(self, progress=None) -> float:
+        """
+        Calculates the maximum price of property, as in App.calculate_price_of_property. The property price is not needed.
+
+        Args:
+        - progress (callable): called with the fraction of the rent simulation done, if the rent has to be simulated
+
+        Returns:
+        - float: the maximum price of property
+
+        Raises:
+        - ValueError: if an input is missing
+        """
+        inputs = dict(self.inputs)
+        down_payment, discount_rate, mortgage_rate, mortgage_length = self._key(inputs, ("down_payment", "discount_rate", "mortgage_rate", "mortgage_length"))
+        rent = self._rent(inputs, progress)
+        rent = rent.mean if isinstance(rent, SimulationResult) else rent
+        number_mortgage_payments = int(mortgage_length) * 12
+        null_pv = self._maintenance(inputs) + rent - down_payment
+        maximum_payment = payment_annuity(null_pv, InterestRate(mortgage_rate), number_mortgage_payments, time_frame="M")
+        return round(Annuity(maximum_payment, number_mortgage_payments, time_frame="M").get_present_value(_discount_rate(discount_rate)) + down_payment)
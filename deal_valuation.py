@@ -0,0 +1,160 @@
+import numpy as np
+
+from cash_flows import *
+
+# order of the deal inputs, matching the fields of the App forms
+deal_inputs = ["property_price", "down_payment", "discount_rate", "mortgage_rate", "mortgage_length", "rent_amount", "non_receipt_chance", "rent_growth", "maintenance_cost", "costs_growth"]
+
+
+def _mortgage_payment(present_value, mortgage_rate, number_periods):
+    # same formula as payment_annuity, on monthly rates given as arrays
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payment = mortgage_rate * present_value / -np.expm1(-number_periods * np.log1p(mortgage_rate))
+    return np.where(mortgage_rate == 0, present_value / number_periods, payment)
+
+
+def _components(discount_rate, rent_amount, non_receipt_chance, rent_growth, maintenance_cost, costs_growth):
+    monthly_discount_rate = convert_rate(discount_rate, "Y", "M")
+    maintenance = -np.asarray(maintenance_cost, dtype=np.float64) * growing_annuity_factor(discount_rate, costs_growth)
+    rent = np.asarray(rent_amount, dtype=np.float64) * (1 - np.asarray(non_receipt_chance, dtype=np.float64)) * growing_annuity_factor(monthly_discount_rate, convert_rate(rent_growth, "Y", "M"))
+    return monthly_discount_rate, maintenance, rent
+
+
+def present_value_of_deals(property_price, down_payment, discount_rate, mortgage_rate, mortgage_length, rent_amount, non_receipt_chance=0, rent_growth=0, maintenance_cost=0, costs_growth=0) -> np.ndarray:
+    """
+    Calculates the present value of real estate deals in one vectorized pass. The inputs are broadcast against each other,
+    so each can be a scalar or an array. The deals are valued like the App: a monthly mortgage annuity, a yearly maintenance
+    perpetuity and a monthly rent perpetuity, of which only the expected part (1 - non_receipt_chance) is received.
+
+    Args:
+    - property_price (float or array-like of float): the price of the property
+    - down_payment (float or array-like of float): the down payment
+    - discount_rate (float or array-like of float): the yearly discount rate
+    - mortgage_rate (float or array-like of float): the yearly mortgage rate
+    - mortgage_length (int or array-like of int): the length of the mortgage in years
+    - rent_amount (float or array-like of float): the monthly rent
+    - non_receipt_chance (float or array-like of float): the chance that the rent of a month is not received
+    - rent_growth (float or array-like of float): the yearly rent growth
+    - maintenance_cost (float or array-like of float): the yearly maintenance cost
+    - costs_growth (float or array-like of float): the yearly growth of the maintenance cost
+
+    Returns:
+    - np.ndarray: the present value of each deal. nan where the rent or the costs grow at least as fast as the discount rate
+    """
+    monthly_discount_rate, maintenance, rent = _components(discount_rate, rent_amount, non_receipt_chance, rent_growth, maintenance_cost, costs_growth)
+    number_periods = np.asarray(mortgage_length) * 12
+    payment = _mortgage_payment(np.asarray(property_price, dtype=np.float64) - down_payment, convert_rate(mortgage_rate, "Y", "M"), number_periods)
+    mortgage = -payment * growing_annuity_factor(monthly_discount_rate, 0, number_periods)
+    return -np.asarray(down_payment, dtype=np.float64) + mortgage + maintenance + rent
+
+
+def price_of_property_of_deals(down_payment, discount_rate, mortgage_rate, mortgage_length, rent_amount, non_receipt_chance=0, rent_growth=0, maintenance_cost=0, costs_growth=0) -> np.ndarray:
+    """
+    Calculates the maximum price of property of real estate deals in one vectorized pass, like App.calculate_price_of_property.
+    The inputs are broadcast against each other, so each can be a scalar or an array.
+
+    Args:
+    - down_payment (float or array-like of float): the down payment
+    - discount_rate (float or array-like of float): the yearly discount rate
+    - mortgage_rate (float or array-like of float): the yearly mortgage rate
+    - mortgage_length (int or array-like of int): the length of the mortgage in years
+    - rent_amount (float or array-like of float): the monthly rent
+    - non_receipt_chance (float or array-like of float): the chance that the rent of a month is not received
+    - rent_growth (float or array-like of float): the yearly rent growth
+    - maintenance_cost (float or array-like of float): the yearly maintenance cost
+    - costs_growth (float or array-like of float): the yearly growth of the maintenance cost
+
+    Returns:
+    - np.ndarray: the maximum price of property of each deal
+    """
+    monthly_discount_rate, maintenance, rent = _components(discount_rate, rent_amount, non_receipt_chance, rent_growth, maintenance_cost, costs_growth)
+    down_payment = np.asarray(down_payment, dtype=np.float64)
+    number_periods = np.asarray(mortgage_length) * 12
+    maximum_payment = _mortgage_payment(maintenance + rent - down_payment, convert_rate(mortgage_rate, "Y", "M"), number_periods)
+    return maximum_payment * growing_annuity_factor(monthly_discount_rate, 0, number_periods) + down_payment
+
+
+class SweepResult:
+    """
+    A class that represents the result of a sensitivity sweep, an N-dimensional array labelled by the swept inputs.
+    """
+    def __init__(self, values: np.ndarray, dims: tuple, coords: dict) -> None:
+        """
+        Initializes a SweepResult object with the values, the name of each dimension and the input values along each dimension.
+
+        Args:
+        - values (np.ndarray): the result for each combination of the swept inputs
+        - dims (tuple of str): the name of the input swept along each dimension
+        - coords (dict): the values of each swept input, by name
+        """
+        self.values = values
+        self.dims = dims
+        self.coords = coords
+
+    def __repr__(self) -> str:
+        shape = ", ".join(f"{dim}: {len(self.coords[dim])}" for dim in self.dims)
+        return f"SweepResult({shape})"
+
+    def sel(self, **coords):
+        """
+        Selects the results at given values of some of the swept inputs.
+
+        Args:
+        - **coords: the value of each selected input, which must be one of its swept values
+
+        Returns:
+        - SweepResult or float: the results over the remaining inputs, or the single result if every input is selected
+
+        Raises:
+        - KeyError: if an input was not swept or the value was not part of the sweep
+        """
+        index = []
+        for dim in self.dims:
+            if dim in coords:
+                matches = np.flatnonzero(self.coords[dim] == coords.pop(dim))
+                if not len(matches):
+                    raise KeyError(f"Value not in the sweep of {dim}")
+                index.append(matches[0])
+            else:
+                index.append(slice(None))
+        if coords:
+            raise KeyError(f"Inputs not swept: {', '.join(coords)}")
+        values = self.values[tuple(index)]
+        dims = tuple(dim for dim, i in zip(self.dims, index) if isinstance(i, slice))
+        if not dims:
+            return float(values)
+        return SweepResult(values, dims, {dim: self.coords[dim] for dim in dims})
+
+
+def sweep(quantity: str = "present_value", **inputs) -> SweepResult:
+    """
+    Values a deal over a grid of inputs in one vectorized pass. Every input given as a one-dimensional array becomes a
+    dimension of the result, in the order the inputs are given. Inputs given as scalars are the same for every point.
+
+    Example: sweep(discount_rate=np.linspace(0.04, 0.08, 50), rent_growth=np.linspace(0, 0.03, 50), property_price=300000, ...)
+
+    Args:
+    - quantity (str): "present_value" for present_value_of_deals or "price_of_property" for price_of_property_of_deals
+    - **inputs: the inputs of the valuation function
+
+    Returns:
+    - SweepResult: the valuation of each combination of the swept inputs
+
+    Raises:
+    - ValueError: if quantity is unknown or an input has more than one dimension
+    """
+    functions = {"present_value": present_value_of_deals, "price_of_property": price_of_property_of_deals}
+    if quantity not in functions:
+        raise ValueError("Quantity must be present_value or price_of_property")
+    swept = {name: np.asarray(value) for name, value in inputs.items() if np.ndim(value) > 0}
+    if any(value.ndim > 1 for value in swept.values()):
+        raise ValueError("Swept inputs must be one-dimensional")
+    dims = tuple(swept)
+    arguments = dict(inputs)
+    for axis, dim in enumerate(dims):
+        shape = [1] * len(dims)
+        shape[axis] = -1
+        arguments[dim] = swept[dim].reshape(shape)
+    values = functions[quantity](**arguments)
+    values = np.broadcast_to(values, tuple(len(swept[dim]) for dim in dims))
+    return SweepResult(values, dims, swept)
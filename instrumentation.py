@@ -0,0 +1,139 @@
+import contextvars
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# instrumentation collecting the counters of the current thread or task, None when instrumentation is disabled.
+# A context variable, so instrument() in one thread does not count the work of worker threads, which start without it
+_active = contextvars.ContextVar("instrumentation", default=None)
+
+
+class Instrumentation:
+    """
+    A class that collects counters and timings from the valuation engine.
+
+    Counters:
+    - rate_in_calls: calls to InterestRate.rate_in
+    - cash_flows_built: CashFlow and MonteCarloCashFlow objects created
+    - cash_flows_discounted: individual cash flows discounted, one at a time or as part of an array
+    - closed_form_valuations: annuities and perpetuities valued with the growing-annuity formulas
+    - rng_draws: random numbers drawn by the Monte Carlo classes
+
+    Timings are kept per component valuation, such as "Perpetuity.get_present_value".
+    """
+    def __init__(self) -> None:
+        self.counters = {}
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, increment: int = 1) -> None:
+        """
+        Adds to a counter.
+
+        Args:
+        - name (str): the name of the counter
+        - increment (int): the amount added to the counter
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + increment
+
+    def record_time(self, name: str, seconds: float) -> None:
+        """
+        Records the duration of a component valuation.
+
+        Args:
+        - name (str): the name of the component valuation
+        - seconds (float): the duration of the valuation
+        """
+        with self._lock:
+            calls, total = self.timings.get(name, (0, 0.0))
+            self.timings[name] = (calls + 1, total + seconds)
+
+    def snapshot(self) -> dict:
+        """
+        Returns the counters and timings collected so far.
+
+        Returns:
+        - dict: the counters by name, and the number of calls and total seconds of each component valuation
+        """
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "timings": {name: {"calls": calls, "seconds": total} for name, (calls, total) in self.timings.items()},
+            }
+
+    def to_json(self, **kwargs) -> str:
+        """
+        Returns the snapshot as JSON.
+
+        Args:
+        - **kwargs: passed to json.dumps
+
+        Returns:
+        - str: the JSON snapshot
+        """
+        return json.dumps(self.snapshot(), **kwargs)
+
+
+def current():
+    """
+    Returns the instrumentation enabled in the current thread or task.
+
+    Returns:
+    - Instrumentation: the instrumentation collecting the counters, or None when instrumentation is disabled
+    """
+    return _active.get()
+
+
+def count(name: str, increment: int = 1) -> None:
+    """
+    Adds to a counter of the instrumentation enabled in the current thread or task, if any.
+
+    Args:
+    - name (str): the name of the counter
+    - increment (int): the amount added to the counter
+    """
+    instrumentation = _active.get()
+    if instrumentation is not None:
+        instrumentation.count(name, increment)
+
+
+@contextmanager
+def instrument():
+    """
+    Enables instrumentation for the duration of a with block. Only work done in the thread or asyncio task that enters
+    the block is counted: threads started inside it, such as a BackgroundRunner worker, and other threads are not.
+
+    Example:
+        with instrument() as instrumentation:
+            perpetuity.get_present_value(discount_rate)
+        print(instrumentation.to_json())
+
+    Yields:
+    - Instrumentation: the counters and timings collected inside the block
+    """
+    instrumentation = Instrumentation()
+    token = _active.set(instrumentation)
+    try:
+        yield instrumentation
+    finally:
+        _active.reset(token)
+
+
+def timed(method):
+    """
+    Decorates a valuation method so its duration is recorded under the name of the class and method when instrumentation is enabled.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        instrumentation = _active.get()
+        if instrumentation is None:
+            return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            instrumentation.record_time(f"{type(self).__name__}.{method.__name__}", time.perf_counter() - start)
+    return wrapper
@@ -0,0 +1,213 @@
+import numpy as np
+
+import backends
+from mc_cash_flow import *
+from cash_flows import _check_perpetuity_converges
+
+
+def _schedule(flows) -> CashFlowSchedule:
+    # the cash flows of a ledger entry that is not an annuity, as a schedule
+    if isinstance(flows, CashFlowSchedule):
+        return flows
+    if isinstance(flows, CashFlow):
+        return CashFlowSchedule([flows.amount], [flows.receivable_in], flows.time_frame)
+    return flows.to_schedule()
+
+
+def _group_schedule(group: tuple, amount: float) -> CashFlowSchedule:
+    # the cash flows of every annuity of a group, summed into one schedule
+    time_frame, cash_flow_growth, payments, _ = group
+    amounts = backends.active.growing_annuity(amount, cash_flow_growth.rate_in(time_frame), payments)
+    return CashFlowSchedule(amounts, np.arange(1, payments + 1, dtype=np.float64), time_frame)
+
+
+def _group_factor(group: tuple, discount_rate) -> float:
+    # the present value of one unit of the first payment of the annuities of a group
+    time_frame, cash_flow_growth, payments, perpetual = group
+    if perpetual:
+        _check_perpetuity_converges(cash_flow_growth, discount_rate, time_frame)
+    if isinstance(discount_rate, InterestRate):
+        return growing_annuity_factor(discount_rate.rate_in(time_frame), cash_flow_growth.rate_in(time_frame), None if perpetual else payments)
+    # the growing-annuity formula needs a flat rate, so other discount curves discount the unit schedule of the group
+    # once, over the first 1000 years of a perpetuity
+    unit = backends.active.growing_annuity(1.0, cash_flow_growth.rate_in(time_frame), payments)
+    return float(unit @ discount_rate.discount_factors(time_frame, payments)[1:])
+
+
+def _net(schedules: list, time_frame: str) -> CashFlowSchedule:
+    # sums the amounts of the schedules that fall on the same whole period of the time frame
+    amounts = np.concatenate([schedule.amounts for schedule in schedules] + [np.empty(0)])
+    periods = np.concatenate([schedule.periods * time_frame_conversion[time_frame] / time_frame_conversion[schedule.time_frame] for schedule in schedules] + [np.empty(0)])
+    whole = periods == np.floor(periods)
+    grid = np.bincount(periods[whole].astype(np.intp), amounts[whole])
+    on_grid = np.flatnonzero(grid)
+    return CashFlowSchedule(np.concatenate((grid[on_grid], amounts[~whole])), np.concatenate((on_grid, periods[~whole])), time_frame)
+
+
+class LedgerValuation:
+    """
+    A class that represents the present value of a ledger, with its attribution to each deal and component.
+
+    The attribution and the netted cash flows are only calculated when read, from the factors the ledger was valued with.
+    """
+    def __init__(self, present_value: float, time_frame: str, keys: list, terms: list, group_factors: dict, schedules: dict, factors: np.ndarray, off_grid_values: dict) -> None:
+        """
+        Initializes a LedgerValuation object.
+
+        Args:
+        - present_value (float): the present value of the netted cash flows
+        - time_frame (str): the time frame of the ledger's grid
+        - keys (list): the (deal, component) of every entry, in the order they were recorded
+        - terms (list): the annuities of the ledger, as their (deal, component), group and expected first payment
+        - group_factors (dict): the present value of a first payment of 1 for the annuities of each group
+        - schedules (dict): the other cash flows of each entry, by (deal, component)
+        - factors (np.ndarray): the discount factor of each period of the grid
+        - off_grid_values (dict): the present value of the schedules that are not on the grid, by (deal, component)
+        """
+        self.present_value = present_value
+        self.time_frame = time_frame
+        self._keys = keys
+        self._terms = terms
+        self._group_factors = group_factors
+        self._schedules = schedules
+        self._factors = factors
+        self._off_grid_values = off_grid_values
+        self._by_entry = None
+
+    @property
+    def by_entry(self) -> dict:
+        if self._by_entry is None:
+            by_entry = dict.fromkeys(self._keys, 0.0)
+            for key, group, amount in self._terms:
+                by_entry[key] += amount * self._group_factors[group]
+            for key, schedule in self._schedules.items():
+                if key in self._off_grid_values:
+                    by_entry[key] += self._off_grid_values[key]
+                else:
+                    by_entry[key] += float(schedule.amounts @ self._factors[schedule._period_indices])
+            self._by_entry = by_entry
+        return self._by_entry
+
+    @property
+    def netted(self) -> CashFlowSchedule:
+        # the net cash flow of each period, which builds the cash flows of the annuities
+        group_amounts = {}
+        for _, group, amount in self._terms:
+            group_amounts[group] = group_amounts.get(group, 0.0) + amount
+        group_schedules = [_group_schedule(group, amount) for group, amount in group_amounts.items()]
+        return _net(list(self._schedules.values()) + group_schedules, self.time_frame)
+
+    def _by(self, position: int) -> dict:
+        totals = {}
+        for key, present_value in self.by_entry.items():
+            totals[key[position]] = totals.get(key[position], 0.0) + present_value
+        return totals
+
+    @property
+    def by_deal(self) -> dict:
+        return self._by(0)
+
+    @property
+    def by_component(self) -> dict:
+        return self._by(1)
+
+
+class CashFlowLedger:
+    """
+    A class that nets the cash flows of many deals and discounts them once.
+
+    Entries are CashFlow, CashFlowSchedule, Annuity, Perpetuity or Monte Carlo annuities, recorded under a deal and
+    a component. Monte Carlo annuities enter at their expected cash flows. Annuities and perpetuities are grouped by
+    time frame, growth and number of payments, and each group is valued with one growing-annuity factor, without
+    building its cash flows. Other flows are moved to the ledger's time frame: those on whole periods are summed on a
+    dense grid discounted with one shared discount factor table, and the rest are discounted at their own periods.
+    The present value of each entry can be read for attribution, and the entries add up to the present value of the ledger.
+    """
+    def __init__(self, time_frame: str = "M") -> None:
+        """
+        Initializes an empty CashFlowLedger object.
+
+        Args:
+        - time_frame (str): the time frame of the grid. Must be one of "Y", "M", "W", "D"
+
+        Raises:
+        - Exception: if time_frame is not one of "Y", "M", "W", "D"
+        """
+        if time_frame not in time_frames:
+            raise Exception("Time frame must be Y/M/W/D")
+        self.time_frame = time_frame
+        self._keys = {}
+        self._terms = []
+        self._schedules = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, deal, component: str, flows) -> None:
+        """
+        Records cash flows under a deal and a component. Flows recorded again under the same deal and component are added to them.
+
+        Args:
+        - deal: the deal the flows belong to, such as its name
+        - component (str): the component of the deal, such as "mortgage" or "rent"
+        - flows (CashFlow, CashFlowSchedule, DatedCashFlowSchedule, Annuity, Perpetuity or MonteCarloAnnuity): the cash flows
+        """
+        key = (deal, component)
+        self._keys[key] = None
+        if isinstance(flows, (Annuity, MonteCarloAnnuity)):
+            perpetual = isinstance(flows, (Perpetuity, MonteCarloPerpetuity))
+            group = (flows.time_frame, flows.cash_flow_growth, flows.payments, perpetual)
+            self._terms.append((key, group, flows.amount * (1 - getattr(flows, "chance_of_zero", 0))))
+            return
+        schedule = _schedule(flows)
+        periods = schedule.periods * time_frame_conversion[self.time_frame] / time_frame_conversion[schedule.time_frame]
+        schedule = CashFlowSchedule(schedule.amounts, periods, self.time_frame)
+        self._schedules[key] = self._schedules[key] + schedule if key in self._schedules else schedule
+
+    def add_deal(self, deal, property_price: float, down_payment: float, mortgage_rate: float, mortgage_length: int, rent_amount: float,
+                 non_receipt_chance: float = 0, rent_growth: float = 0, maintenance_cost: float = 0, costs_growth: float = 0) -> None:
+        """
+        Records the components of a deal valued like the App: the down payment, a monthly mortgage annuity, a yearly
+        maintenance perpetuity and a monthly rent perpetuity, of which only the expected part (1 - non_receipt_chance) is received.
+
+        Args:
+        - deal: the deal, such as its name
+        - the deal inputs of present_value_of_deals, except the discount rate, which is given when the ledger is valued
+        """
+        number_periods_mortgage = int(mortgage_length) * 12
+        mortgage_payment = payment_annuity(property_price - down_payment, InterestRate(mortgage_rate), number_periods_mortgage, time_frame="M")
+        self.add(deal, "down_payment", CashFlow(-down_payment, 0))
+        self.add(deal, "mortgage", Annuity(-mortgage_payment, number_periods_mortgage, time_frame="M"))
+        self.add(deal, "maintenance", Perpetuity(-maintenance_cost, cash_flow_growth=InterestRate(costs_growth)))
+        self.add(deal, "rent", MonteCarloPerpetuity(rent_amount, time_frame="M", cash_flow_growth=InterestRate(rent_growth), chance_of_zero=non_receipt_chance))
+
+    def get_present_value(self, discount_rate: InterestRate) -> LedgerValuation:
+        """
+        Values each group of annuities with one factor, and nets the other cash flows on the grid to discount them once.
+
+        Args:
+        - discount_rate (InterestRate or YieldCurve): the discount rate to use for calculating the present value
+
+        Returns:
+        - LedgerValuation: the present value of the ledger, of each entry, and the netted cash flows
+
+        Raises:
+        - ValueError: if a perpetuity grows at least as fast as the discount rate, or as the long-end rate of a discount curve
+        """
+        group_amounts = {}
+        for _, group, amount in self._terms:
+            group_amounts[group] = group_amounts.get(group, 0.0) + amount
+        group_factors = {group: _group_factor(group, discount_rate) for group in group_amounts}
+        instrumentation.count("closed_form_valuations", len(group_factors))
+        present_value = sum(amount * group_factors[group] for group, amount in group_amounts.items())
+        on_grid = [schedule for schedule in self._schedules.values() if schedule._period_indices is not None]
+        horizon = max((int(schedule._period_indices.max()) for schedule in on_grid if len(schedule)), default=0)
+        factors = discount_rate.discount_factors(self.time_frame, horizon)
+        netted = np.zeros(horizon + 1)
+        for schedule in on_grid:
+            netted += np.bincount(schedule._period_indices, schedule.amounts, minlength=horizon + 1)
+        present_value += float(netted @ factors)
+        off_grid_values = {key: float(schedule.amounts @ schedule.discount_factors(discount_rate)) for key, schedule in self._schedules.items() if schedule._period_indices is None}
+        present_value += sum(off_grid_values.values())
+        instrumentation.count("cash_flows_discounted", horizon + 1 + sum(len(self._schedules[key]) for key in off_grid_values))
+        return LedgerValuation(present_value, self.time_frame, list(self._keys), list(self._terms), group_factors, dict(self._schedules), factors, off_grid_values)
@@ -3,6 +3,12 @@ import tkinter as tk
 from cash_flows import *
 from tkinter import ttk
 from tkinter import messagebox
+from background import BackgroundRunner
+from deal_model import DealModel
+from yield_curve import parse_discount_rate
+
+# milliseconds without edits before the result is recalculated
+recalculation_delay = 500
 
 class App:
     def __init__(self, master):
@@ -21,17 +27,28 @@ class App:
         
         self.create_widgets()
         
+        # calculations run on a worker thread so the window stays responsive
+        self.runner = BackgroundRunner(master)
+        self.model = DealModel()
+        self.recalculation = None
+        for variable in (self.property_price, self.down_payment, self.discount_rate, self.mortgage_rate, self.mortgage_length, self.rent_amount, self.rent_growth, self.maintenance_cost, self.costs_growth):
+            variable.trace_add("write", self.schedule_recalculation)
+        
     def create_widgets(self):
         # create notebook
         self.notebook = ttk.Notebook(self.master)
         self.notebook.grid(row=0, column=0, columnspan=2, padx=10, pady=10)
+        
+        # create a progress bar for the calculations running in the background
+        self.progress = ttk.Progressbar(self.master, mode="determinate", maximum=1.0)
+        self.progress.grid(row=1, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="ew")
 
         # create first tab for present value calculation
         self.present_value_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.present_value_tab, text="Present Value")
         tk.Label(self.present_value_tab, text="Property Price").grid(row=0, column=0)
         tk.Label(self.present_value_tab, text="Down Payment").grid(row=1, column=0)
-        tk.Label(self.present_value_tab, text="Discount Rate (Decimal)").grid(row=2, column=0)
+        tk.Label(self.present_value_tab, text="Discount Rate (Decimal or tenor:rate curve)").grid(row=2, column=0)
         tk.Label(self.present_value_tab, text="Mortgage Rate (Decimal)").grid(row=3, column=0)
         tk.Label(self.present_value_tab, text="Mortgage Length (Years)").grid(row=4, column=0)
         tk.Label(self.present_value_tab, text="Rent Amount Monthly").grid(row=5, column=0)
@@ -60,7 +77,7 @@ class App:
         self.price_of_property_tab = ttk.Frame(self.notebook)
         self.notebook.add(self.price_of_property_tab, text="Price of Property")
         tk.Label(self.price_of_property_tab, text="Down Payment").grid(row=0, column=0)
-        tk.Label(self.price_of_property_tab, text="Discount Rate (Decimal)").grid(row=1, column=0)
+        tk.Label(self.price_of_property_tab, text="Discount Rate (Decimal or tenor:rate curve)").grid(row=1, column=0)
         tk.Label(self.price_of_property_tab, text="Mortgage Rate (Decimal)").grid(row=2, column=0)
         tk.Label(self.price_of_property_tab, text="Mortgage Length (Years)").grid(row=3, column=0)
         tk.Label(self.price_of_property_tab, text="Rent Amount Monthly").grid(row=4, column=0)
@@ -84,56 +101,78 @@ class App:
         self.calculate_button = tk.Button(self.price_of_property_tab, text="Calculate", command=self.calculate_price_of_property)
         self.calculate_button.grid(row=8, column=0, columnspan=2, pady=10)
 
-    def calculate_present_value(self):
-        property_price = float(self.property_price.get())
-        down_payment = float(self.down_payment.get())
-        discount_rate = InterestRate(float(self.discount_rate.get()))
-        mortgage_rate = InterestRate(float(self.mortgage_rate.get()))
-        mortgage_length = int(self.mortgage_length.get())
-        rent_amount = float(self.rent_amount.get())
-        rent_growth = InterestRate(float(self.rent_growth.get()))
-        maintenance_costs = float(self.maintenance_cost.get())
-        costs_growth = InterestRate(float(self.costs_growth.get()))
-        
-         #Do the calculations and store the result
-        
-        number_periods_mortgage = mortgage_length*12
-        
-        mortgage_payment = payment_annuity(property_price-down_payment, mortgage_rate, number_periods_mortgage)
-        mortgage = Annuity(-mortgage_payment, number_periods_mortgage,time_frame="M", )
-        
-        maintenance = Perpetuity(-maintenance_costs, cash_flow_growth=costs_growth)
-        
-        rent = Perpetuity(rent_amount, time_frame="M", cash_flow_growth=rent_growth)
-        
-        present_value = -down_payment + mortgage.get_present_value(discount_rate) + maintenance.get_present_value(discount_rate) + rent.get_present_value(discount_rate)
+    def schedule_recalculation(self, *args):
+        # wait until the fields have not been edited for a moment before recalculating
+        if self.recalculation is not None:
+            self.master.after_cancel(self.recalculation)
+        self.recalculation = self.master.after(recalculation_delay, self.recalculate)
+        
+    def recalculate(self):
+        self.recalculation = None
+        if self.notebook.index(self.notebook.select()) == 0:
+            self.calculate_present_value(live=True)
+        else:
+            self.calculate_price_of_property(live=True)
+            
+    def run_in_background(self, task, result_label, show_result):
+        self.progress.configure(value=0)
+        result_label.configure(text="Calculating...")
+        
+        def on_done(result):
+            self.progress.configure(value=1)
+            show_result(result)
+            
+        def on_error(error):
+            self.progress.configure(value=0)
+            result_label.configure(text=f"Calculation failed: {error}")
+            
+        self.runner.submit(task, on_done, on_error, lambda fraction: self.progress.configure(value=fraction))
+
+    def calculate_present_value(self, live=False):
+        try:
+            property_price = float(self.property_price.get())
+            down_payment = float(self.down_payment.get())
+            discount_rate = parse_discount_rate(self.discount_rate.get())
+            mortgage_rate = float(self.mortgage_rate.get())
+            mortgage_length = int(self.mortgage_length.get())
+            rent_amount = float(self.rent_amount.get())
+            rent_growth = float(self.rent_growth.get())
+            maintenance_costs = float(self.maintenance_cost.get())
+            costs_growth = float(self.costs_growth.get())
+        except ValueError:
+            # fields being edited are not complete yet
+            if not live:
+                self.result_label_pv.configure(text="Every field must be a number")
+            return
+        
+        # only the components whose inputs changed are valued again
+        self.model.update(property_price=property_price, down_payment=down_payment, discount_rate=discount_rate, mortgage_rate=mortgage_rate, mortgage_length=mortgage_length,
+                          rent_amount=rent_amount, rent_growth=rent_growth, maintenance_cost=maintenance_costs, costs_growth=costs_growth)
         
         #display result in a message box
-        self.result_label_pv.configure(text=f"The present value of the real estate project is: " + str(round(present_value,2)))
+        self.run_in_background(lambda report: self.model.present_value(progress=report), self.result_label_pv, lambda present_value: self.result_label_pv.configure(text=f"The present value of the real estate project is: " + str(round(present_value,2))))
 
         
-    def calculate_price_of_property(self):
-        down_payment = float(self.down_payment.get())
-        discount_rate = InterestRate(float(self.discount_rate.get()))
-        mortgage_rate = InterestRate(float(self.mortgage_rate.get()))
-        mortgage_length = int(self.mortgage_length.get())
-        rent_amount = float(self.rent_amount.get())
-        rent_growth = InterestRate(float(self.rent_growth.get()))
-        maintenance_costs = float(self.maintenance_cost.get())
-        costs_growth = InterestRate(float(self.costs_growth.get()))
-        
-        
-        number_mortgage_payments = mortgage_length*12
-        
-        maintenance = Perpetuity(-maintenance_costs, cash_flow_growth=costs_growth)
-        
-        rent = Perpetuity(rent_amount, time_frame="M", cash_flow_growth=rent_growth)
-        
-        null_pv = maintenance.get_present_value(discount_rate) + rent.get_present_value(discount_rate) - down_payment
-        maximum_payment = payment_annuity(null_pv, mortgage_rate, number_mortgage_payments)
-        price_of_property = round(Annuity(maximum_payment, number_mortgage_payments, time_frame="M").get_present_value(discount_rate)+ down_payment)
-        
-        self.result_label_price.configure(text=f'The Maximum Price of Property is: {price_of_property}')
+    def calculate_price_of_property(self, live=False):
+        try:
+            down_payment = float(self.down_payment.get())
+            discount_rate = parse_discount_rate(self.discount_rate.get())
+            mortgage_rate = float(self.mortgage_rate.get())
+            mortgage_length = int(self.mortgage_length.get())
+            rent_amount = float(self.rent_amount.get())
+            rent_growth = float(self.rent_growth.get())
+            maintenance_costs = float(self.maintenance_cost.get())
+            costs_growth = float(self.costs_growth.get())
+        except ValueError:
+            # fields being edited are not complete yet
+            if not live:
+                self.result_label_price.configure(text="Every field must be a number")
+            return
+        
+        self.model.update(down_payment=down_payment, discount_rate=discount_rate, mortgage_rate=mortgage_rate, mortgage_length=mortgage_length,
+                          rent_amount=rent_amount, rent_growth=rent_growth, maintenance_cost=maintenance_costs, costs_growth=costs_growth)
+        
+        self.run_in_background(lambda report: self.model.price_of_property(progress=report), self.result_label_price, lambda price_of_property: self.result_label_price.configure(text=f'The Maximum Price of Property is: {price_of_property}'))
 
 if __name__ == "__main__":
     root = tk.Tk()
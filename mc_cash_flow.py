@@ -1,5 +1,46 @@
 from cash_flows import *
+from cash_flows import _check_perpetuity_converges
 from random import random
+from statistics import NormalDist
+import warnings
+
+import numpy as np
+
+import backends
+import instrumentation
+from instrumentation import timed
+from streaming_stats import StreamingSummary
+
+# upper bound on the number of random draws held in memory at once by a simulation
+simulation_block_size = 2 ** 22
+
+# ways of drawing the uniforms of a simulation
+sampling_methods = ["plain", "antithetic", "stratified", "sobol"]
+
+
+def _draw_uniforms(rng: np.random.Generator, method: str, n_trials: int, dimension: int) -> np.ndarray:
+    # one row of uniforms per trial, one column per cash flow
+    if method == "antithetic":
+        # each trial is followed by its mirror image
+        uniforms = np.empty((n_trials, dimension))
+        uniforms[0::2] = rng.random(((n_trials + 1) // 2, dimension))
+        uniforms[1::2] = 1 - uniforms[0:n_trials - 1:2]
+        return uniforms
+    if method == "stratified":
+        # Latin hypercube: each column has exactly one draw in each of the n_trials strata
+        strata = rng.permuted(np.broadcast_to(np.arange(n_trials, dtype=np.float64)[:, None], (n_trials, dimension)), axis=0)
+        return (strata + rng.random((n_trials, dimension))) / n_trials
+    if method == "sobol":
+        try:
+            from scipy.stats import qmc
+        except ImportError:
+            raise ImportError("Sobol sampling requires scipy") from None
+        with warnings.catch_warnings():
+            # the balance of the points is best for powers of two, but any number of trials is valid
+            warnings.simplefilter("ignore", UserWarning)
+            return qmc.Sobol(dimension, scramble=True, seed=rng).random(n_trials)
+    return rng.random((n_trials, dimension))
+
 
 class MonteCarloCashFlow():
     def __init__(self, amount: float, receivable_in: float, time_frame: str = "Y", chance_of_zero: float = 0) -> None:
@@ -20,6 +61,7 @@ class MonteCarloCashFlow():
             raise Exception("Time frame must be Y/M/W/D")
         if chance_of_zero < 0 or chance_of_zero > 1:
             raise ValueError("Chance of zero must be between 0 and 1")
+        instrumentation.count("cash_flows_built")
         self.amount = amount
         self.receivable_in = receivable_in
         self.time_frame  = time_frame
@@ -35,12 +77,36 @@ class MonteCarloCashFlow():
         Returns:
         - float: the present value of the cash flow, taking into account the chance of the amount being zero
         """
+        instrumentation.count("rng_draws")
         if random() < self.chance_of_zero:
             return 0
         else:
-            present_value = self.amount / (1 + discount_rate.rate_in(self.time_frame)) ** (self.receivable_in)
+            instrumentation.count("cash_flows_discounted")
+            present_value = self.amount * discount_rate.discount_factor(self.receivable_in, self.time_frame)
             return present_value
 
+def _control_coefficient(values: np.ndarray, control_values: np.ndarray) -> float:
+    # the coefficient of the control variate that minimizes the variance of the corrected values
+    control_variance = control_values.var(ddof=1) if len(values) > 1 else 0.0
+    if control_variance == 0:
+        return 0.0
+    return float(np.cov(values, control_values)[0, 1] / control_variance)
+
+
+def _method_estimate(values: np.ndarray, method: str, bounds) -> tuple:
+    # the mean of the trials and its standard error from the antithetic pairs, or from the replicates of stratified and
+    # Sobol sampling. None for independent trials, whose standard error is the spread of the trials
+    n_trials = len(values)
+    if method == "antithetic" and n_trials >= 4:
+        pairs = values[:n_trials // 2 * 2].reshape(-1, 2).mean(axis=1)
+        return float(values.mean()), float(pairs.std(ddof=1) / len(pairs) ** 0.5)
+    if method in ("stratified", "sobol") and n_trials >= 2:
+        replicates = [values[start:stop].mean() for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+        if len(replicates) > 1:
+            return float(values.mean()), float(np.std(replicates, ddof=1) / len(replicates) ** 0.5)
+    return None, None
+
+
 class MonteCarloAnnuity():
     def __init__(self, amount: float, payments: float, time_frame: str = "Y", cash_flow_growth: InterestRate = InterestRate(0), chance_of_zero: float = 0) -> None:
         """
@@ -64,10 +130,31 @@ class MonteCarloAnnuity():
         self.amount = amount
         self.payments = payments
         self.time_frame = time_frame
-        self.cash_flows = []
-        for n in range(1, payments + 1): 
-            self.cash_flows.append(MonteCarloCashFlow(self.amount * (1 + cash_flow_growth.rate_in(time_frame)) ** n, n, time_frame, chance_of_zero))
+        self.cash_flow_growth = cash_flow_growth
+        self.chance_of_zero = chance_of_zero
+    
+    def __len__(self) -> int:
+        return self.payments
+    
+    def __iter__(self):
+        """
+        Builds the cash flows of the annuity one at a time.
+        
+        Yields:
+        - MonteCarloCashFlow: the cash flow of each period, starting at period 1
+        """
+        growth = 1 + self.cash_flow_growth.rate_in(self.time_frame)
+        for n in range(1, self.payments + 1):
+            yield MonteCarloCashFlow(self.amount * growth ** n, n, self.time_frame, self.chance_of_zero)
     
+    @property
+    def cash_flows(self) -> list:
+        """
+        Materializes every cash flow of the annuity. Prefer iterating over the annuity directly.
+        """
+        return list(self)
+    
+    @timed
     def get_present_value(self, discount_rate: InterestRate) -> float:
         """
         Calculates the present value of the annuity using the given discount rate.
@@ -79,11 +166,170 @@ class MonteCarloAnnuity():
         - float: the present value of the annuity
         """
         sum_present_value = 0
-        for n in self.cash_flows:
+        for n in self:
             sum_present_value += n.get_present_value(discount_rate, )
                 
         return round(sum_present_value, 2)
     
+    def _discounted_cash_flows(self, discount_rate: InterestRate) -> np.ndarray:
+        schedule = CashFlowSchedule.from_annuity(self)
+        instrumentation.count("cash_flows_discounted", self.payments)
+        return schedule.amounts * schedule.discount_factors(discount_rate)
+    
+    def _block_trials(self) -> int:
+        # blocks hold an even number of trials so antithetic pairs are never split
+        return max(2, simulation_block_size // max(1, self.payments) // 2 * 2)
+    
+    def _present_value_blocks(self, discounted: np.ndarray, rng: np.random.Generator, method: str, bounds, count_received: bool = False):
+        # the present value of the trials between consecutive bounds, one block at a time, and optionally the number
+        # of payments received in each trial
+        received = None
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if stop == start:
+                continue
+            uniforms = _draw_uniforms(rng, method, stop - start, self.payments)
+            instrumentation.count("rng_draws", uniforms.size // 2 if method == "antithetic" else uniforms.size)
+            if count_received:
+                received = backends.active.masked_present_values(np.ones(self.payments), uniforms, self.chance_of_zero)
+            yield start, stop, backends.active.masked_present_values(discounted, uniforms, self.chance_of_zero), received
+    
+    @timed
+    def simulate(self, discount_rate: InterestRate, n_trials: int, seed=None, progress=None, method: str = "plain", control_variate: bool = False) -> "SimulationResult":
+        """
+        Simulates the present value of the annuity over many trials at once. Every trial zeroes each cash flow
+        with probability chance_of_zero, using a NumPy random generator.
+        
+        Sampling methods:
+        - plain: independent uniform draws
+        - antithetic: every other trial uses the mirror image 1 - u of the draws of the trial before it
+        - stratified: each block of trials is a Latin hypercube, with one draw per stratum for every cash flow
+        - sobol: each block of trials is a scrambled Sobol sequence. Requires scipy, and at most 21201 cash flows
+        For stratified and sobol the blocks are independent replicates, and the standard error comes from the spread of their means.
+        
+        Args:
+        - discount_rate (InterestRate): the discount rate to use for calculating the present value
+        - n_trials (int): the number of trials to simulate
+        - seed (int, np.random.SeedSequence or np.random.Generator): the seed of the random generator. None for a random seed
+        - progress (callable): called with the fraction of the trials done after each block of trials. It may raise to stop the simulation
+        - method (str): the sampling method. Must be one of "plain", "antithetic", "stratified", "sobol"
+        - control_variate (bool): whether to correct the mean with the number of payments received in each trial as a
+          control variate, whose expected value (1 - chance_of_zero) * payments is known exactly
+        
+        Returns:
+        - SimulationResult: the distribution of the present value over the trials
+        
+        Raises:
+        - ValueError: if n_trials is not positive or method is unknown
+        - ImportError: if method is sobol and scipy is not installed
+        """
+        if n_trials < 1:
+            raise ValueError("Number of trials must be positive")
+        if method not in sampling_methods:
+            raise ValueError("Method must be plain/antithetic/stratified/sobol")
+        rng = np.random.default_rng(seed)
+        discounted = self._discounted_cash_flows(discount_rate)
+        present_values = np.empty(n_trials)
+        received = np.empty(n_trials) if control_variate else None
+        block_trials = self._block_trials()
+        if method in ("stratified", "sobol"):
+            # at least two replicates are needed to estimate the standard error
+            bounds = np.linspace(0, n_trials, max(2, -(-n_trials // block_trials)) + 1).astype(int)
+        else:
+            bounds = list(range(0, n_trials, block_trials)) + [n_trials]
+        for start, stop, block, received_block in self._present_value_blocks(discounted, rng, method, bounds, control_variate):
+            present_values[start:stop] = block
+            if control_variate:
+                received[start:stop] = received_block
+            if progress is not None:
+                progress(stop / n_trials)
+        values, coefficient = present_values, None
+        if control_variate:
+            control_mean = (1 - self.chance_of_zero) * self.payments
+            coefficient = _control_coefficient(present_values, received)
+            values = present_values - coefficient * (received - control_mean)
+        # the standard error comes from the same pairs or replicates with or without the control variate
+        mean, standard_error = _method_estimate(values, method, bounds)
+        if control_variate and mean is None:
+            mean, standard_error = float(values.mean()), float(values.std(ddof=1) / n_trials ** 0.5) if n_trials > 1 else 0.0
+        result = SimulationResult(present_values, mean, standard_error)
+        result.control_coefficient = coefficient
+        return result
+    
+    @timed
+    def simulate_streaming(self, discount_rate: InterestRate, n_trials: int, seed=None, progress=None, summary: StreamingSummary = None) -> StreamingSummary:
+        """
+        Simulates the present value of the annuity like simulate with plain sampling, but only accumulates summary statistics,
+        so memory does not grow with the number of trials.
+        
+        Args:
+        - discount_rate (InterestRate): the discount rate to use for calculating the present value
+        - n_trials (int): the number of trials to simulate
+        - seed (int, np.random.SeedSequence or np.random.Generator): the seed of the random generator. None for a random seed
+        - progress (callable): called with the fraction of the trials done after each block of trials. It may raise to stop the simulation
+        - summary (StreamingSummary): the summary to add the trials to, such as one with a histogram. None for a new summary
+        
+        Returns:
+        - StreamingSummary: the distribution of the present value over the trials
+        
+        Raises:
+        - ValueError: if n_trials is not positive
+        """
+        if n_trials < 1:
+            raise ValueError("Number of trials must be positive")
+        rng = np.random.default_rng(seed)
+        summary = StreamingSummary() if summary is None else summary
+        discounted = self._discounted_cash_flows(discount_rate)
+        bounds = list(range(0, n_trials, self._block_trials())) + [n_trials]
+        for _, stop, block, _ in self._present_value_blocks(discounted, rng, "plain", bounds):
+            summary.update(block)
+            if progress is not None:
+                progress(stop / n_trials)
+        return summary
+    
+    def simulate_adaptive(self, discount_rate: InterestRate, target_standard_error: float = None, target_interval_width: float = None, confidence: float = 0.95,
+                          batch_trials: int = 10000, max_trials: int = 10000000, seed=None, progress=None, method: str = "plain", control_variate: bool = False) -> "SimulationResult":
+        """
+        Simulates batches of trials until the mean present value is precise enough, or max_trials is reached.
+        
+        Args:
+        - discount_rate (InterestRate): the discount rate to use for calculating the present value
+        - target_standard_error (float): the standard error of the mean at which to stop
+        - target_interval_width (float): the width of the confidence interval of the mean at which to stop
+        - confidence (float): the confidence level of the interval, between 0 and 1
+        - batch_trials (int): the number of trials simulated between two checks of the precision
+        - max_trials (int): the maximum number of trials
+        - seed (int, np.random.SeedSequence or np.random.Generator): the seed of the random generator. None for a random seed
+        - progress (callable): called with the fraction of max_trials done after each batch
+        - method (str): the sampling method, as in simulate
+        - control_variate (bool): whether to use the control variate, as in simulate
+        
+        Returns:
+        - SimulationResult: the distribution of the present value over every trial simulated
+        
+        Raises:
+        - ValueError: if no target is given, or confidence is not between 0 and 1
+        """
+        if target_standard_error is None and target_interval_width is None:
+            raise ValueError("A target standard error or interval width is required")
+        if confidence <= 0 or confidence >= 1:
+            raise ValueError("Confidence must be between 0 and 1")
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        rng = np.random.default_rng(seed)
+        results = []
+        trials = 0
+        while trials < max_trials:
+            batch = min(batch_trials, max_trials - trials)
+            results.append(self.simulate(discount_rate, batch, seed=rng, method=method, control_variate=control_variate))
+            trials += batch
+            result = SimulationResult.merge(results)
+            if progress is not None:
+                progress(trials / max_trials)
+            if target_standard_error is not None and result.standard_error <= target_standard_error:
+                break
+            if target_interval_width is not None and 2 * z * result.standard_error <= target_interval_width:
+                break
+        return result
+    
 class MonteCarloPerpetuity(MonteCarloAnnuity):
     def __init__(self, amount: float, time_frame: str = "Y", cash_flow_growth: InterestRate = InterestRate(0), chance_of_zero: float = 0) -> None:
         """
@@ -100,3 +346,143 @@ class MonteCarloPerpetuity(MonteCarloAnnuity):
         - ValueError: if chance_of_zero is not between 0 and 1
         """
         super().__init__(amount, 1000 * time_frame_conversion[time_frame], time_frame, cash_flow_growth= cash_flow_growth, chance_of_zero = chance_of_zero)
+
+    def get_present_value(self, discount_rate: InterestRate) -> float:
+        """
+        Calculates the present value of the perpetuity over one trial, truncated after 1000 years of cash flows.
+
+        Args:
+        - discount_rate (InterestRate or YieldCurve): the discount rate to use for calculating the present value
+
+        Returns:
+        - float: the present value of the perpetuity
+
+        Raises:
+        - ValueError: if the cash flows grow at least as fast as the discount rate, or as the long-end rate of a discount curve
+        """
+        _check_perpetuity_converges(self.cash_flow_growth, discount_rate, self.time_frame)
+        return super().get_present_value(discount_rate)
+
+    def _discounted_cash_flows(self, discount_rate: InterestRate) -> np.ndarray:
+        # simulations value the cash flows of the first 1000 years, which only approximate the perpetuity if it converges
+        _check_perpetuity_converges(self.cash_flow_growth, discount_rate, self.time_frame)
+        return super()._discounted_cash_flows(discount_rate)
+
+
+class SimulationResult:
+    """
+    A class that represents the distribution of a present value over Monte Carlo trials.
+    """
+    def __init__(self, present_values, mean: float = None, standard_error: float = None) -> None:
+        """
+        Initializes a SimulationResult object with the present value of each trial.
+        
+        Args:
+        - present_values (array-like of float): the present value of each trial
+        - mean (float): the estimate of the mean, when variance reduction gives a better one than the average of the trials
+        - standard_error (float): the standard error of that estimate
+        """
+        self.present_values = np.asarray(present_values, dtype=np.float64)
+        self._mean = mean
+        self._standard_error = standard_error
+        self.control_coefficient = None
+        
+    @classmethod
+    def merge(cls, results) -> "SimulationResult":
+        """
+        Merges the results of several simulations, keeping the order of the trials. Mean estimates from variance
+        reduction are combined, weighted by the number of trials.
+        
+        Args:
+        - results (iterable of SimulationResult): the results to merge
+        
+        Returns:
+        - SimulationResult: the result holding every trial
+        """
+        results = list(results)
+        present_values = np.concatenate([result.present_values for result in results])
+        if all(result._mean is None for result in results):
+            return cls(present_values)
+        weights = np.array([len(result) for result in results]) / len(present_values)
+        mean = float(sum(weight * result.mean for weight, result in zip(weights, results)))
+        standard_error = float(sum((weight * result.standard_error) ** 2 for weight, result in zip(weights, results)) ** 0.5)
+        return cls(present_values, mean, standard_error)
+    
+    def __len__(self) -> int:
+        return len(self.present_values)
+        
+    @property
+    def mean(self) -> float:
+        if self._mean is not None:
+            return self._mean
+        return float(self.present_values.mean())
+    
+    @property
+    def std(self) -> float:
+        return float(self.present_values.std(ddof=1)) if len(self) > 1 else 0.0
+    
+    @property
+    def standard_error(self) -> float:
+        if self._standard_error is not None:
+            return self._standard_error
+        return self.std / len(self) ** 0.5
+    
+    def with_control_variate(self, control_values, control_mean: float) -> "SimulationResult":
+        """
+        Corrects the mean with a control variate, a quantity drawn alongside each trial whose expected value is known exactly.
+        
+        Args:
+        - control_values (array-like of float): the value of the control in each trial
+        - control_mean (float): the exact expected value of the control
+        
+        Returns:
+        - SimulationResult: the same trials, with the corrected mean, its standard error for independent trials and the
+          fitted control_coefficient
+        """
+        control_values = np.asarray(control_values, dtype=np.float64)
+        coefficient = _control_coefficient(self.present_values, control_values)
+        adjusted = self.present_values - coefficient * (control_values - control_mean)
+        standard_error = float(adjusted.std(ddof=1) / len(self) ** 0.5) if len(self) > 1 else 0.0
+        result = SimulationResult(self.present_values, float(adjusted.mean()), standard_error)
+        result.control_coefficient = float(coefficient)
+        return result
+    
+    def percentile(self, q):
+        """
+        Calculates percentiles of the present value.
+        
+        Args:
+        - q (float or array-like of float): the percentiles to calculate, between 0 and 100
+        
+        Returns:
+        - float or np.ndarray: the present value at each percentile
+        """
+        result = np.percentile(self.present_values, q)
+        return float(result) if np.ndim(result) == 0 else result
+    
+    def value_at_risk(self, confidence: float = 0.95) -> float:
+        """
+        Calculates the value at risk, the shortfall from the mean present value that is not exceeded with the given confidence.
+        
+        Args:
+        - confidence (float): the confidence level, between 0 and 1
+        
+        Returns:
+        - float: the value at risk
+        
+        Raises:
+        - ValueError: if confidence is not between 0 and 1
+        """
+        if confidence <= 0 or confidence >= 1:
+            raise ValueError("Confidence must be between 0 and 1")
+        return self.mean - self.percentile(100 * (1 - confidence))
+    
+    def summary(self) -> dict:
+        """
+        Summarizes the distribution of the present value.
+        
+        Returns:
+        - dict: the number of trials, mean, standard deviation, 5th/50th/95th percentiles and 95% value at risk
+        """
+        p5, p50, p95 = self.percentile([5, 50, 95])
+        return {"trials": len(self), "mean": self.mean, "std": self.std, "p5": float(p5), "p50": float(p50), "p95": float(p95), "var_95": self.value_at_risk(0.95)}
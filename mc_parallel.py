@@ -0,0 +1,94 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from mc_cash_flow import *
+
+
+def _summarize_stream(annuity: MonteCarloAnnuity, discount_rate: InterestRate, n_trials: int, seed: np.random.SeedSequence, histogram_range: tuple, bins: int) -> StreamingSummary:
+    return annuity.simulate_streaming(discount_rate, n_trials, seed=seed, summary=StreamingSummary(histogram_range=histogram_range, bins=bins))
+
+
+class ParallelSimulationRunner:
+    """
+    A class that runs Monte Carlo simulations on a pool of processes.
+
+    The trials are split into streams of a fixed size, each seeded with its own child of the root seed.
+    Since the streams do not depend on the number of workers, the merged result is the same for a given
+    root seed whatever the number of workers.
+    """
+    def __init__(self, workers: int = None, trials_per_stream: int = 10000) -> None:
+        """
+        Initializes a ParallelSimulationRunner object with a number of workers and the size of each random stream.
+
+        Args:
+        - workers (int): the number of worker processes. None for the number of CPUs, 1 to run in this process
+        - trials_per_stream (int): the number of trials simulated from each child seed
+
+        Raises:
+        - ValueError: if workers or trials_per_stream is not positive
+        """
+        if workers is not None and workers < 1:
+            raise ValueError("Number of workers must be positive")
+        if trials_per_stream < 1:
+            raise ValueError("Number of trials per stream must be positive")
+        self.workers = workers
+        self.trials_per_stream = trials_per_stream
+        self._pool = None
+
+    def __enter__(self) -> "ParallelSimulationRunner":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Shuts down the worker processes.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _map(self, function, *iterables):
+        if self.workers == 1:
+            return map(function, *iterables)
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+        return self._pool.map(function, *iterables)
+
+    def run(self, annuity: MonteCarloAnnuity, discount_rate: InterestRate, n_trials: int, seed=None, histogram_range: tuple = None, bins: int = 100) -> StreamingSummary:
+        """
+        Simulates the present value of a Monte Carlo annuity, splitting the trials across the worker processes.
+        Each worker reduces its streams to summary statistics, so only those are sent back and memory does not grow
+        with the number of trials.
+
+        Args:
+        - annuity (MonteCarloAnnuity): the annuity to simulate
+        - discount_rate (InterestRate): the discount rate to use for calculating the present value
+        - n_trials (int): the number of trials to simulate
+        - seed (int or np.random.SeedSequence): the root seed. None for a random seed
+        - histogram_range (tuple of float): the lower and upper bounds of the histogram of the present value. None for no histogram
+        - bins (int): the number of bins of the histogram
+
+        Returns:
+        - StreamingSummary: the distribution of the present value over the trials
+
+        Raises:
+        - ValueError: if n_trials is not positive
+        """
+        sizes, seeds = self._streams(n_trials, seed)
+        n_streams = len(sizes)
+        summaries = self._map(_summarize_stream, [annuity] * n_streams, [discount_rate] * n_streams, sizes, seeds, [histogram_range] * n_streams, [bins] * n_streams)
+        return StreamingSummary.merge(summaries)
+
+    def _streams(self, n_trials: int, seed) -> tuple:
+        if n_trials < 1:
+            raise ValueError("Number of trials must be positive")
+        # children are spawned from a copy, since spawning advances the caller's seed and the next run would get other streams
+        if isinstance(seed, np.random.SeedSequence):
+            root = np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key, pool_size=seed.pool_size)
+        else:
+            root = np.random.SeedSequence(seed)
+        sizes = [min(self.trials_per_stream, n_trials - start) for start in range(0, n_trials, self.trials_per_stream)]
+        return sizes, root.spawn(len(sizes))
@@ -0,0 +1,245 @@
+import numpy as np
+
+from mc_cash_flow import *
+from cash_flows import _check_perpetuity_converges
+
+# upper bound on the number of trials simulated together
+path_trial_block = 4096
+
+
+class StochasticDiscountRate:
+    """
+    A class that represents a yearly discount rate following a mean-reverting (Vasicek) process.
+    """
+    def __init__(self, rate: float, volatility: float = 0, mean_reversion: float = 0.1, long_term_rate: float = None) -> None:
+        """
+        Initializes a StochasticDiscountRate object with the starting rate and the parameters of its process.
+
+        Args:
+        - rate (float): the yearly rate at the start
+        - volatility (float): the yearly volatility of the rate
+        - mean_reversion (float): the yearly speed at which the rate reverts to its long-term level
+        - long_term_rate (float): the level the rate reverts to. None for the starting rate
+
+        Raises:
+        - ValueError: if volatility or mean_reversion is negative
+        """
+        if volatility < 0 or mean_reversion < 0:
+            raise ValueError("Volatility and mean reversion must not be negative")
+        self.rate = rate
+        self.volatility = volatility
+        self.mean_reversion = mean_reversion
+        self.long_term_rate = rate if long_term_rate is None else long_term_rate
+
+    @property
+    def long_end_rate(self) -> float:
+        # the rate reverts to its long-term level, which discounts the far future of a perpetuity
+        return self.long_term_rate
+
+
+class PathAnnuity:
+    """
+    A class that represents an annuity whose payments follow simulated paths.
+
+    The property alternates between occupied and vacant periods as a Markov chain, so vacancies last for several periods,
+    and the payments grow at an uncertain, lognormal rate. The discount rate can be stochastic and correlated with the
+    growth of the payments. Paths are generated in blocks of trials and periods, so memory does not grow with the
+    number of trials or payments.
+    """
+    def __init__(self, amount: float, payments: int, time_frame: str = "Y", cash_flow_growth: InterestRate = InterestRate(0), growth_volatility: float = 0,
+                 vacancy_rate: float = 0, mean_vacancy_periods: float = 1) -> None:
+        """
+        Initializes a PathAnnuity object with an amount, number of payments, time frame, and the processes of growth and vacancy.
+
+        Args:
+        - amount (float): the amount of each payment, before growth
+        - payments (int): the number of payments
+        - time_frame (str): the time frame of the payments. Must be one of "Y", "M", "W", "D"
+        - cash_flow_growth (InterestRate): the expected rate at which the payments grow
+        - growth_volatility (float): the yearly volatility of the growth of the payments
+        - vacancy_rate (float): the long-run fraction of periods during which the property is vacant, between 0 and 1
+        - mean_vacancy_periods (float): the average number of periods a vacancy lasts, at least 1
+
+        Raises:
+        - Exception: if time_frame is not one of "Y", "M", "W", "D"
+        - ValueError: if the vacancy parameters are out of range or growth_volatility is negative
+        """
+        if time_frame not in time_frames:
+            raise Exception("Time frame must be Y/M/W/D")
+        if vacancy_rate < 0 or vacancy_rate >= 1:
+            raise ValueError("Vacancy rate must be between 0 and 1")
+        if mean_vacancy_periods < 1:
+            raise ValueError("Mean vacancy periods must be at least 1")
+        if growth_volatility < 0:
+            raise ValueError("Growth volatility must not be negative")
+        self.amount = amount
+        self.payments = payments
+        self.time_frame = time_frame
+        self.cash_flow_growth = cash_flow_growth
+        self.growth_volatility = growth_volatility
+        self.vacancy_rate = vacancy_rate
+        self.mean_vacancy_periods = mean_vacancy_periods
+        # transition probabilities of the vacancy chain, which make vacancy_rate its stationary vacancy
+        self.re_let_chance = 1 / mean_vacancy_periods
+        self.move_out_chance = vacancy_rate * self.re_let_chance / (1 - vacancy_rate)
+        if self.move_out_chance > 1:
+            raise ValueError("Vacancies are too short for this vacancy rate")
+
+    def get_expected_present_value(self, discount_rate: InterestRate) -> float:
+        """
+        Calculates the expected present value for a deterministic discount rate. Vacancy starts from its long-run
+        distribution, so each payment is received with probability 1 - vacancy_rate.
+
+        Args:
+        - discount_rate (InterestRate): the discount rate to use for calculating the present value
+
+        Returns:
+        - float: the expected present value
+        """
+        return (1 - self.vacancy_rate) * Annuity(self.amount, self.payments, self.time_frame, self.cash_flow_growth).get_present_value(discount_rate)
+
+    def simulate(self, discount_rate, n_trials: int, seed=None, correlation: float = 0, progress=None) -> SimulationResult:
+        """
+        Simulates the present value of the annuity over many paths.
+
+        Args:
+        - discount_rate (InterestRate, YieldCurve or StochasticDiscountRate): the discount rate to use for calculating the present value
+        - n_trials (int): the number of paths to simulate
+        - seed (int, np.random.SeedSequence or np.random.Generator): the seed of the random generator. None for a random seed
+        - correlation (float): the correlation between the shocks of the payment growth and of a stochastic discount rate, between -1 and 1
+        - progress (callable): called with the fraction of the paths done after each block of paths
+
+        Returns:
+        - SimulationResult: the distribution of the present value over the paths
+
+        Raises:
+        - ValueError: if n_trials is not positive or correlation is not between -1 and 1
+        """
+        if n_trials < 1:
+            raise ValueError("Number of trials must be positive")
+        if correlation < -1 or correlation > 1:
+            raise ValueError("Correlation must be between -1 and 1")
+        rng = np.random.default_rng(seed)
+        present_values = np.empty(n_trials)
+        trial_block = min(n_trials, path_trial_block)
+        period_block = max(1, simulation_block_size // trial_block)
+        for start in range(0, n_trials, trial_block):
+            stop = min(start + trial_block, n_trials)
+            present_values[start:stop] = self._simulate_block(rng, discount_rate, stop - start, period_block, correlation)
+            if progress is not None:
+                progress(stop / n_trials)
+        return SimulationResult(present_values)
+
+    def _simulate_block(self, rng: np.random.Generator, discount_rate, n_trials: int, period_block: int, correlation: float) -> np.ndarray:
+        periods_per_year = time_frame_conversion[self.time_frame]
+        period_growth = self.cash_flow_growth.rate_in(self.time_frame)
+        period_volatility = self.growth_volatility / periods_per_year ** 0.5
+        # drift of the log payment, such that the expected payment grows at cash_flow_growth
+        log_drift = np.log1p(period_growth) - period_volatility ** 2 / 2
+        stochastic_rate = isinstance(discount_rate, StochasticDiscountRate)
+        if stochastic_rate:
+            rate = np.full(n_trials, float(discount_rate.rate))
+            log_discount = np.zeros(n_trials)
+            reversion = discount_rate.mean_reversion / periods_per_year
+            rate_shock = discount_rate.volatility / periods_per_year ** 0.5
+        else:
+            factors = discount_rate.discount_factors(self.time_frame, self.payments)
+        present_values = np.zeros(n_trials)
+        log_payment = np.zeros(n_trials)
+        occupied = rng.random(n_trials) >= self.vacancy_rate
+        draws = n_trials
+        for first in range(1, self.payments + 1, period_block):
+            last = min(first + period_block, self.payments + 1)
+            width = last - first
+            # payments, with the uncertain growth accumulated from one block to the next
+            if period_volatility > 0:
+                growth_shocks = rng.standard_normal((n_trials, width))
+                draws += growth_shocks.size
+                log_payments = log_payment[:, None] + np.cumsum(log_drift + period_volatility * growth_shocks, axis=1)
+                log_payment = log_payments[:, -1]
+            else:
+                growth_shocks = None
+                log_payments = np.broadcast_to(np.arange(first, last) * np.log1p(period_growth), (n_trials, width))
+            cash_flows = self.amount * np.exp(log_payments)
+            vacancy_draws = rng.random((n_trials, width))
+            draws += vacancy_draws.size
+            if stochastic_rate:
+                rate_shocks = rng.standard_normal((n_trials, width))
+                draws += rate_shocks.size
+                if growth_shocks is not None:
+                    rate_shocks = correlation * growth_shocks + (1 - correlation ** 2) ** 0.5 * rate_shocks
+            for column in range(width):
+                # occupied tenants move out with move_out_chance, vacant units are re-let with re_let_chance
+                if column or first > 1:
+                    occupied = np.where(occupied, vacancy_draws[:, column] >= self.move_out_chance, vacancy_draws[:, column] < self.re_let_chance)
+                if stochastic_rate:
+                    log_discount -= np.log1p(rate) / periods_per_year
+                    discount = np.exp(log_discount)
+                    rate = np.maximum(rate + reversion * (discount_rate.long_term_rate - rate) + rate_shock * rate_shocks[:, column], -0.99)
+                else:
+                    discount = factors[first + column]
+                present_values += np.where(occupied, cash_flows[:, column], 0.0) * discount
+        instrumentation.count("rng_draws", draws)
+        instrumentation.count("cash_flows_discounted", n_trials * self.payments)
+        return present_values
+
+
+class PathPerpetuity(PathAnnuity):
+    """
+    A class that represents a perpetuity whose payments follow simulated paths. Paths stop after 1000 years of payments.
+    """
+    def __init__(self, amount: float, time_frame: str = "Y", cash_flow_growth: InterestRate = InterestRate(0), growth_volatility: float = 0,
+                 vacancy_rate: float = 0, mean_vacancy_periods: float = 1) -> None:
+        """
+        Initializes a PathPerpetuity object with an amount, time frame, and the processes of growth and vacancy.
+
+        Args:
+        - amount (float): the amount of each payment, before growth
+        - time_frame (str): the time frame of the payments. Must be one of "Y", "M", "W", "D"
+        - cash_flow_growth (InterestRate): the expected rate at which the payments grow
+        - growth_volatility (float): the yearly volatility of the growth of the payments
+        - vacancy_rate (float): the long-run fraction of periods during which the property is vacant, between 0 and 1
+        - mean_vacancy_periods (float): the average number of periods a vacancy lasts, at least 1
+
+        Raises:
+        - Exception: if time_frame is not one of "Y", "M", "W", "D"
+        - ValueError: if the vacancy parameters are out of range or growth_volatility is negative
+        """
+        super().__init__(amount, 1000 * time_frame_conversion[time_frame], time_frame, cash_flow_growth, growth_volatility, vacancy_rate, mean_vacancy_periods)
+
+    def get_expected_present_value(self, discount_rate: InterestRate) -> float:
+        """
+        Calculates the expected present value for a deterministic discount rate. Vacancy starts from its long-run
+        distribution, so each payment is received with probability 1 - vacancy_rate.
+
+        Args:
+        - discount_rate (InterestRate or YieldCurve): the discount rate to use for calculating the present value
+
+        Returns:
+        - float: the expected present value
+
+        Raises:
+        - ValueError: if the payments grow at least as fast as the discount rate, or as the long-end rate of a discount curve
+        """
+        return (1 - self.vacancy_rate) * Perpetuity(self.amount, self.time_frame, self.cash_flow_growth).get_present_value(discount_rate)
+
+    def simulate(self, discount_rate, n_trials: int, seed=None, correlation: float = 0, progress=None) -> SimulationResult:
+        """
+        Simulates the present value of the perpetuity over many paths.
+
+        Args:
+        - discount_rate (InterestRate, YieldCurve or StochasticDiscountRate): the discount rate to use for calculating the present value
+        - n_trials (int): the number of paths to simulate
+        - seed (int, np.random.SeedSequence or np.random.Generator): the seed of the random generator. None for a random seed
+        - correlation (float): the correlation between the shocks of the payment growth and of a stochastic discount rate, between -1 and 1
+        - progress (callable): called with the fraction of the paths done after each block of paths
+
+        Returns:
+        - SimulationResult: the distribution of the present value over the paths
+
+        Raises:
+        - ValueError: if n_trials is not positive, correlation is not between -1 and 1, or the payments grow at least
+          as fast as the discount rate, the long-end rate of a discount curve or the long-term rate of a stochastic rate
+        """
+        _check_perpetuity_converges(self.cash_flow_growth, discount_rate, self.time_frame)
+        return super().simulate(discount_rate, n_trials, seed, correlation, progress)
@@ -4,6 +4,14 @@ from cash_flows import *
 from tkinter import ttk
 from tkinter import messagebox
 from mc_cash_flow import *
+from deal_model import DealModel
+from yield_curve import parse_discount_rate
+from background import BackgroundRunner
+
+# number of Monte Carlo trials used to value the rent
+rent_trials = 10000
+# milliseconds without edits before the result is recalculated
+recalculation_delay = 500
 
 class App:
     def __init__(self, master):
@@ -23,10 +31,21 @@ class App:
         
         self.create_widgets()
         
+        # calculations run on a worker thread so the window stays responsive
+        self.runner = BackgroundRunner(master)
+        self.model = DealModel(rent_trials=rent_trials)
+        self.recalculation = None
+        for variable in (self.property_price, self.down_payment, self.discount_rate, self.mortgage_rate, self.mortgage_length, self.rent_amount, self.non_receipt_rent, self.rent_growth, self.maintenance_cost, self.costs_growth):
+            variable.trace_add("write", self.schedule_recalculation)
+        
     def create_widgets(self):
         # create notebook
         self.notebook = ttk.Notebook(self.master)
         self.notebook.grid(row=0, column=0, columnspan=2, padx=10, pady=10)
+        
+        # create a progress bar for the calculations running in the background
+        self.progress = ttk.Progressbar(self.master, mode="determinate", maximum=1.0)
+        self.progress.grid(row=1, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="ew")
 
         # create first tab for present value calculation
         self.present_value_tab = ttk.Frame(self.notebook)
@@ -37,7 +56,7 @@ class App:
         tk.Label(self.present_value_tab, text="Down Payment").grid(row=1, column=0)
         tk.Entry(self.present_value_tab, textvariable=self.down_payment).grid(row=1, column=1)
         
-        tk.Label(self.present_value_tab, text="Discount Rate (Decimal)").grid(row=2, column=0)
+        tk.Label(self.present_value_tab, text="Discount Rate (Decimal or tenor:rate curve)").grid(row=2, column=0)
         tk.Entry(self.present_value_tab, textvariable=self.discount_rate).grid(row=2, column=1)
         
         tk.Label(self.present_value_tab, text="Mortgage Rate (Decimal)").grid(row=3, column=0)
@@ -77,7 +96,7 @@ class App:
         tk.Label(self.price_of_property_tab, text="Down Payment").grid(row=0, column=0)
         tk.Entry(self.price_of_property_tab, textvariable=self.down_payment).grid(row=0, column=1)
         
-        tk.Label(self.price_of_property_tab, text="Discount Rate (Decimal)").grid(row=1, column=0)
+        tk.Label(self.price_of_property_tab, text="Discount Rate (Decimal or tenor:rate curve)").grid(row=1, column=0)
         tk.Entry(self.price_of_property_tab, textvariable=self.discount_rate).grid(row=1, column=1)
         
         tk.Label(self.price_of_property_tab, text="Mortgage Rate (Decimal)").grid(row=2, column=0)
@@ -109,62 +128,89 @@ class App:
         self.calculate_button = tk.Button(self.price_of_property_tab, text="Calculate", command=self.calculate_price_of_property)
         self.calculate_button.grid(row=8, column=0, columnspan=2, pady=10)
 
-    def calculate_present_value(self):
-        property_price = float(self.property_price.get())
-        down_payment = float(self.down_payment.get())
-        discount_rate = InterestRate(float(self.discount_rate.get()))
-        mortgage_rate = InterestRate(float(self.mortgage_rate.get()))
-        mortgage_length = int(self.mortgage_length.get())
-        rent_amount = float(self.rent_amount.get())
-        non_payment_chance = float(self.non_receipt_rent.get())
-        rent_growth = InterestRate(float(self.rent_growth.get()))
-        maintenance_costs = float(self.maintenance_cost.get())
-        costs_growth = InterestRate(float(self.costs_growth.get()))
-        
-         #Do the calculations and store the result
-        
-        number_periods_mortgage = mortgage_length*12
-        
-        mortgage_payment = payment_annuity(property_price-down_payment, mortgage_rate, number_periods_mortgage, time_frame="M")
-        mortgage = Annuity(-mortgage_payment, number_periods_mortgage,time_frame="M", )
-        print(mortgage.get_present_value(discount_rate))
-        
-        maintenance = Perpetuity(-maintenance_costs, cash_flow_growth=costs_growth)
-        
-        rent = MonteCarloPerpetuity(rent_amount, time_frame="M", cash_flow_growth=rent_growth, chance_of_zero= non_payment_chance)
-        
-        present_value = -down_payment + mortgage.get_present_value(discount_rate) + maintenance.get_present_value(discount_rate) + rent.get_present_value(discount_rate)
+    def schedule_recalculation(self, *args):
+        # wait until the fields have not been edited for a moment before recalculating
+        if self.recalculation is not None:
+            self.master.after_cancel(self.recalculation)
+        self.recalculation = self.master.after(recalculation_delay, self.recalculate)
+        
+    def recalculate(self):
+        self.recalculation = None
+        if self.notebook.index(self.notebook.select()) == 0:
+            self.calculate_present_value(live=True)
+        else:
+            self.calculate_price_of_property(live=True)
+            
+    def run_in_background(self, task, result_label, show_result):
+        self.progress.configure(value=0)
+        result_label.configure(text="Calculating...")
+        
+        def on_done(result):
+            self.progress.configure(value=1)
+            show_result(result)
+            
+        def on_error(error):
+            self.progress.configure(value=0)
+            result_label.configure(text=f"Calculation failed: {error}")
+            
+        self.runner.submit(task, on_done, on_error, lambda fraction: self.progress.configure(value=fraction))
+
+    def calculate_present_value(self, live=False):
+        try:
+            property_price = float(self.property_price.get())
+            down_payment = float(self.down_payment.get())
+            discount_rate = parse_discount_rate(self.discount_rate.get())
+            mortgage_rate = float(self.mortgage_rate.get())
+            mortgage_length = int(self.mortgage_length.get())
+            rent_amount = float(self.rent_amount.get())
+            non_receipt_chance = float(self.non_receipt_rent.get())
+            rent_growth = float(self.rent_growth.get())
+            maintenance_costs = float(self.maintenance_cost.get())
+            costs_growth = float(self.costs_growth.get())
+        except ValueError:
+            # fields being edited are not complete yet
+            if not live:
+                self.result_label_pv.configure(text="Every field must be a number")
+            return
+        
+        # only the components whose inputs changed are valued again
+        self.model.update(property_price=property_price, down_payment=down_payment, discount_rate=discount_rate, mortgage_rate=mortgage_rate, mortgage_length=mortgage_length,
+                          rent_amount=rent_amount, non_receipt_chance=non_receipt_chance, rent_growth=rent_growth, maintenance_cost=maintenance_costs, costs_growth=costs_growth)
+        
+        def task(report):
+            present_value = self.model.present_value(progress=report)
+            low, high = self.model.present_value_percentile([5, 95])
+            return present_value, low, high
+        
+        def show_result(result):
+            present_value, low, high = result
+            self.result_label_pv.configure(text=f"The present value of the real estate project is: {round(present_value)} (90% range: {round(low)} to {round(high)})")
         
         #display result in a message box
-        self.result_label_pv.configure(text=f"The present value of the real estate project is: " + str(round(present_value)))
+        self.run_in_background(task, self.result_label_pv, show_result)
 
         
-    def calculate_price_of_property(self):
-        down_payment = float(self.down_payment.get())
-        discount_rate = InterestRate(float(self.discount_rate.get()))
-        mortgage_rate = InterestRate(float(self.mortgage_rate.get()))
-        mortgage_length = int(self.mortgage_length.get())
-        rent_amount = float(self.rent_amount.get())
-        non_payment_chance = float(self.non_receipt_rent.get())
-        rent_growth = InterestRate(float(self.rent_growth.get()))
-        maintenance_costs = float(self.maintenance_cost.get())
-        costs_growth = InterestRate(float(self.costs_growth.get()))
-        
-        
-        number_mortgage_payments = mortgage_length*12
-        
-        maintenance = Perpetuity(-maintenance_costs, cash_flow_growth=costs_growth)
-        print(maintenance.get_present_value(discount_rate))
-        
-        rent = MonteCarloPerpetuity(rent_amount, time_frame="M", cash_flow_growth=rent_growth, chance_of_zero= non_payment_chance)
-        print(rent.get_present_value(discount_rate))
-        
-        null_pv = maintenance.get_present_value(discount_rate) + rent.get_present_value(discount_rate) - down_payment
-        maximum_payment = payment_annuity(null_pv, mortgage_rate, number_mortgage_payments, time_frame="M")
-        print(maximum_payment)
-        price_of_property = round(Annuity(maximum_payment, number_mortgage_payments, time_frame="M").get_present_value(discount_rate)+ down_payment)
-        
-        self.result_label_price.configure(text=f'The Maximum Price of Property is: {price_of_property}')
+    def calculate_price_of_property(self, live=False):
+        try:
+            down_payment = float(self.down_payment.get())
+            discount_rate = parse_discount_rate(self.discount_rate.get())
+            mortgage_rate = float(self.mortgage_rate.get())
+            mortgage_length = int(self.mortgage_length.get())
+            rent_amount = float(self.rent_amount.get())
+            non_receipt_chance = float(self.non_receipt_rent.get())
+            rent_growth = float(self.rent_growth.get())
+            maintenance_costs = float(self.maintenance_cost.get())
+            costs_growth = float(self.costs_growth.get())
+        except ValueError:
+            # fields being edited are not complete yet
+            if not live:
+                self.result_label_price.configure(text="Every field must be a number")
+            return
+        
+        self.model.update(down_payment=down_payment, discount_rate=discount_rate, mortgage_rate=mortgage_rate, mortgage_length=mortgage_length,
+                          rent_amount=rent_amount, non_receipt_chance=non_receipt_chance, rent_growth=rent_growth, maintenance_cost=maintenance_costs, costs_growth=costs_growth)
+        
+        self.run_in_background(lambda report: self.model.price_of_property(progress=report), self.result_label_price, lambda price_of_property: self.result_label_price.configure(text=f'The Maximum Price of Property is: {price_of_property}'))
 
 if __name__ == "__main__":
     root = tk.Tk()
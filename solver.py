@@ -0,0 +1,187 @@
+import numpy as np
+
+from deal_valuation import *
+from deal_valuation import _components, _mortgage_payment
+
+# growth steps closer to zero than this use the limit of the weighted annuity sum
+_small_step = 1e-6
+
+
+def _weighted_annuity_sum(discount_rate, growth_rate, number_periods=None):
+    # sum of n * q ** n over the payments, with q = (1 + growth_rate) / (1 + discount_rate)
+    discount_rate = np.asarray(discount_rate, dtype=np.float64)
+    step = (growth_rate - discount_rate) / (1 + discount_rate)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        if number_periods is None:
+            return np.where(step < 0, (1 + step) / step ** 2, np.nan)
+        powered = np.expm1(number_periods * np.log1p(step))
+        weighted = (1 + step) * (number_periods * (1 + powered) * step - powered) / step ** 2
+    return np.where(np.abs(step) < _small_step, number_periods * (number_periods + 1) / 2, weighted)
+
+
+def growing_annuity_factor_derivative(discount_rate, growth_rate, number_periods=None, periods_per_year: int = 1):
+    """
+    Calculates the derivative of growing_annuity_factor with respect to the yearly discount rate. Works element-wise on arrays.
+
+    Args:
+    - discount_rate (float or array-like of float): the discount rate per period
+    - growth_rate (float or array-like of float): the growth rate of the cash flows per period
+    - number_periods (int or array-like of int): the number of payments. None for a perpetuity
+    - periods_per_year (int): the number of periods in a year, as in time_frame_conversion
+
+    Returns: the derivative of the present value of the growing annuity with respect to the yearly discount rate
+    """
+    yearly_discount_rate = (1 + np.asarray(discount_rate, dtype=np.float64)) ** periods_per_year - 1
+    return -_weighted_annuity_sum(discount_rate, growth_rate, number_periods) / (periods_per_year * (1 + yearly_discount_rate))
+
+
+def _mortgage_payment_derivative(present_value, mortgage_rate, number_periods):
+    # derivative of _mortgage_payment with respect to the monthly mortgage rate
+    with np.errstate(divide="ignore", invalid="ignore"):
+        discounted = (1 + mortgage_rate) ** -number_periods
+        derivative = present_value * ((1 - discounted) - mortgage_rate * number_periods * discounted / (1 + mortgage_rate)) / (1 - discounted) ** 2
+    return np.where(mortgage_rate == 0, present_value * (number_periods + 1) / (2 * number_periods), derivative)
+
+
+def newton_solve(function, lower, upper, initial_guess=None, tolerance: float = 1e-10, max_iterations: int = 100) -> np.ndarray:
+    """
+    Finds roots of a batch of functions with Newton's method, safeguarded by bisection so it stays inside a bracket.
+
+    Args:
+    - function (callable): maps an array of points to the values and derivatives of the functions at those points
+    - lower (float or array-like of float): the lower end of the bracket of each root
+    - upper (float or array-like of float): the upper end of the bracket of each root
+    - initial_guess (float or array-like of float): the starting point of each root. None for the middle of the bracket
+    - tolerance (float): the relative change between two iterations under which a root has converged
+    - max_iterations (int): the maximum number of iterations
+
+    Returns:
+    - np.ndarray: the roots. nan where the function does not change sign over the bracket
+    """
+    lower, upper = np.broadcast_arrays(np.asarray(lower, dtype=np.float64), np.asarray(upper, dtype=np.float64))
+    value_lower, _ = function(lower)
+    value_upper, _ = function(upper)
+    value_lower, value_upper = np.broadcast_arrays(value_lower, value_upper)
+    bracketed = np.sign(value_lower) != np.sign(value_upper)
+    # orient the bracket so that the function is negative at negative_end and positive at positive_end
+    swap = value_lower > 0
+    negative_end = np.where(swap, upper, lower).copy()
+    positive_end = np.where(swap, lower, upper).copy()
+    if initial_guess is None:
+        x = (negative_end + positive_end) / 2
+    else:
+        x = np.clip(initial_guess, np.minimum(lower, upper), np.maximum(lower, upper)) + np.zeros_like(negative_end)
+    converged = ~bracketed
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(max_iterations):
+            value, derivative = function(x)
+            negative_end = np.where(value < 0, x, negative_end)
+            positive_end = np.where(value > 0, x, positive_end)
+            step = value / derivative
+            candidate = x - step
+            inside = np.isfinite(candidate) & (candidate > np.minimum(negative_end, positive_end)) & (candidate < np.maximum(negative_end, positive_end))
+            candidate = np.where(inside, candidate, (negative_end + positive_end) / 2)
+            converged |= (value == 0) | (np.abs(candidate - x) <= tolerance * (1 + np.abs(x)))
+            x = np.where(converged, x, candidate)
+            if converged.all():
+                break
+    return np.where(bracketed, x, np.nan)
+
+
+def break_even_price_of_deals(down_payment, discount_rate, mortgage_rate, mortgage_length, rent_amount, non_receipt_chance=0, rent_growth=0, maintenance_cost=0, costs_growth=0) -> np.ndarray:
+    """
+    Calculates the break-even price of property of real estate deals, the price at which present_value_of_deals is zero.
+    The present value is linear in the price, so one Newton step from the down payment lands on the root.
+
+    This is not the maximum price of price_of_property_of_deals, which follows App.calculate_price_of_property: the App
+    turns the value of the deal into a mortgage payment at the mortgage rate, then discounts that payment at the discount
+    rate, so a deal bought at its price still has a present value unless the mortgage rate equals the discount rate.
+
+    Args:
+    - the inputs of present_value_of_deals, except property_price
+
+    Returns:
+    - np.ndarray: the break-even price of property of each deal
+    """
+    monthly_discount_rate, maintenance, rent = _components(discount_rate, rent_amount, non_receipt_chance, rent_growth, maintenance_cost, costs_growth)
+    down_payment = np.asarray(down_payment, dtype=np.float64)
+    number_periods = np.asarray(mortgage_length) * 12
+    # derivative of the present value with respect to the price
+    derivative = -_mortgage_payment(1.0, convert_rate(mortgage_rate, "Y", "M"), number_periods) * growing_annuity_factor(monthly_discount_rate, 0, number_periods)
+    value_at_down_payment = -down_payment + maintenance + rent
+    return down_payment - value_at_down_payment / derivative
+
+
+def break_even_rent_of_deals(property_price, down_payment, discount_rate, mortgage_rate, mortgage_length, non_receipt_chance=0, rent_growth=0, maintenance_cost=0, costs_growth=0) -> np.ndarray:
+    """
+    Calculates the monthly rent at which present_value_of_deals is zero.
+    The present value is linear in the rent, so one Newton step from a rent of zero lands on the root.
+
+    Args:
+    - the inputs of present_value_of_deals, except rent_amount
+
+    Returns:
+    - np.ndarray: the break-even monthly rent of each deal
+    """
+    value_without_rent = present_value_of_deals(property_price, down_payment, discount_rate, mortgage_rate, mortgage_length, 0, non_receipt_chance, rent_growth, maintenance_cost, costs_growth)
+    # derivative of the present value with respect to the rent
+    derivative = (1 - np.asarray(non_receipt_chance, dtype=np.float64)) * growing_annuity_factor(convert_rate(discount_rate, "Y", "M"), convert_rate(rent_growth, "Y", "M"))
+    return -value_without_rent / derivative
+
+
+def internal_rate_of_return_of_deals(property_price, down_payment, mortgage_rate, mortgage_length, rent_amount, non_receipt_chance=0, rent_growth=0, maintenance_cost=0, costs_growth=0, upper_bound: float = 10.0, tolerance: float = 1e-10) -> np.ndarray:
+    """
+    Calculates the yearly discount rate at which present_value_of_deals is zero, with Newton's method on the analytic derivative
+    of the growing-annuity formulas. The rate is searched above both growth rates, where the perpetuities converge.
+
+    Args:
+    - the inputs of present_value_of_deals, except discount_rate
+    - upper_bound (float): the highest rate searched
+    - tolerance (float): the relative change between two iterations under which a rate has converged
+
+    Returns:
+    - np.ndarray: the internal rate of return of each deal. nan where there is no root in the searched range
+    """
+    down_payment = np.asarray(down_payment, dtype=np.float64)
+    number_periods = np.asarray(mortgage_length) * 12
+    payment = _mortgage_payment(np.asarray(property_price, dtype=np.float64) - down_payment, convert_rate(mortgage_rate, "Y", "M"), number_periods)
+    maintenance_cost = np.asarray(maintenance_cost, dtype=np.float64)
+    rent = np.asarray(rent_amount, dtype=np.float64) * (1 - np.asarray(non_receipt_chance, dtype=np.float64))
+    monthly_rent_growth = convert_rate(rent_growth, "Y", "M")
+
+    def present_value_and_derivative(rate):
+        monthly_rate = convert_rate(rate, "Y", "M")
+        value = -down_payment - payment * growing_annuity_factor(monthly_rate, 0, number_periods) - maintenance_cost * growing_annuity_factor(rate, costs_growth) + rent * growing_annuity_factor(monthly_rate, monthly_rent_growth)
+        derivative = -payment * growing_annuity_factor_derivative(monthly_rate, 0, number_periods, 12) - maintenance_cost * growing_annuity_factor_derivative(rate, costs_growth) + rent * growing_annuity_factor_derivative(monthly_rate, monthly_rent_growth, None, 12)
+        return value, derivative
+
+    lower_bound = np.maximum(np.maximum(rent_growth, costs_growth), -0.99) + 1e-6
+    return newton_solve(present_value_and_derivative, lower_bound, upper_bound, initial_guess=0.08, tolerance=tolerance)
+
+
+def max_mortgage_rate_of_deals(property_price, down_payment, discount_rate, mortgage_length, rent_amount, non_receipt_chance=0, rent_growth=0, maintenance_cost=0, costs_growth=0, bounds: tuple = (0.0, 1.0), tolerance: float = 1e-10) -> np.ndarray:
+    """
+    Calculates the yearly mortgage rate at which present_value_of_deals is zero, with Newton's method on the analytic
+    derivative of the mortgage payment.
+
+    Args:
+    - the inputs of present_value_of_deals, except mortgage_rate
+    - bounds (tuple of float): the lowest and highest mortgage rates searched
+    - tolerance (float): the relative change between two iterations under which a rate has converged
+
+    Returns:
+    - np.ndarray: the maximum mortgage rate of each deal. nan where there is no root in the searched range
+    """
+    monthly_discount_rate, maintenance, rent = _components(discount_rate, rent_amount, non_receipt_chance, rent_growth, maintenance_cost, costs_growth)
+    down_payment = np.asarray(down_payment, dtype=np.float64)
+    principal = np.asarray(property_price, dtype=np.float64) - down_payment
+    number_periods = np.asarray(mortgage_length) * 12
+    mortgage_factor = growing_annuity_factor(monthly_discount_rate, 0, number_periods)
+
+    def present_value_and_derivative(rate):
+        monthly_rate = convert_rate(rate, "Y", "M")
+        value = -down_payment - _mortgage_payment(principal, monthly_rate, number_periods) * mortgage_factor + maintenance + rent
+        derivative = -_mortgage_payment_derivative(principal, monthly_rate, number_periods) * mortgage_factor * (1 + monthly_rate) / (12 * (1 + np.asarray(rate)))
+        return value, derivative
+
+    return newton_solve(present_value_and_derivative, bounds[0], bounds[1], initial_guess=0.05, tolerance=tolerance)
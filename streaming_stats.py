@@ -0,0 +1,385 @@
+import numpy as np
+
+# number of centroids a quantile digest keeps about half of; more centroids give more accurate quantiles
+digest_compression = 300
+
+
+class RunningMoments:
+    """
+    A class that accumulates the count, mean, variance, minimum and maximum of a stream of values.
+
+    The mean and variance are updated with Welford's method, a block of values at a time, so they stay accurate
+    for any number of values and two accumulators can be merged exactly.
+    """
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self._sum_of_squares = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def merge(cls, accumulators) -> "RunningMoments":
+        """
+        Merges accumulators of separate streams, as if their values had been accumulated together.
+
+        Args:
+        - accumulators (iterable of RunningMoments): the accumulators to merge
+
+        Returns:
+        - RunningMoments: the merged accumulator
+        """
+        merged = cls()
+        for accumulator in accumulators:
+            merged._add(accumulator.count, accumulator.mean, accumulator._sum_of_squares, accumulator.min, accumulator.max)
+        return merged
+
+    def _add(self, count: int, mean: float, sum_of_squares: float, minimum: float, maximum: float) -> None:
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._sum_of_squares += sum_of_squares + delta ** 2 * self.count * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+
+    def update(self, values) -> "RunningMoments":
+        """
+        Adds values to the stream.
+
+        Args:
+        - values (float or array-like of float): the values to add
+
+        Returns:
+        - RunningMoments: this accumulator
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values):
+            mean = values.mean()
+            self._add(len(values), float(mean), float(((values - mean) ** 2).sum()), float(values.min()), float(values.max()))
+        return self
+
+    @property
+    def variance(self) -> float:
+        return self._sum_of_squares / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self) -> float:
+        return self.variance ** 0.5
+
+    @property
+    def standard_error(self) -> float:
+        return self.std / self.count ** 0.5 if self.count else 0.0
+
+
+class QuantileDigest:
+    """
+    A class that estimates the quantiles of a stream of values with a t-digest.
+
+    Values are summarized by weighted centroids, which are small near the extremes and large near the median,
+    so tail quantiles stay accurate. The number of centroids is bounded by the compression whatever the number of values,
+    and digests of separate streams can be merged.
+    """
+    def __init__(self, compression: int = digest_compression) -> None:
+        """
+        Initializes an empty QuantileDigest object.
+
+        Args:
+        - compression (int): the number of centroids kept is at most about half of it
+
+        Raises:
+        - ValueError: if compression is less than 10
+        """
+        if compression < 10:
+            raise ValueError("Compression must be at least 10")
+        self.compression = compression
+        self._means = np.empty(0)
+        self._weights = np.empty(0)
+        self._buffer = []
+        self._buffered = 0
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def merge(cls, digests) -> "QuantileDigest":
+        """
+        Merges the digests of separate streams.
+
+        Args:
+        - digests (iterable of QuantileDigest): the digests to merge, which should share a compression
+
+        Returns:
+        - QuantileDigest: the merged digest, with the compression of the first digest
+        """
+        digests = list(digests)
+        merged = cls(digests[0].compression if digests else digest_compression)
+        for digest in digests:
+            digest._compress()
+            merged._add(digest._means, digest._weights, digest.min, digest.max)
+        merged._compress()
+        return merged
+
+    def _add(self, means: np.ndarray, weights: np.ndarray, minimum: float, maximum: float) -> None:
+        if len(means) == 0:
+            return
+        self._buffer.append((means, weights))
+        self._buffered += len(means)
+        self.count += float(weights.sum())
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+        if self._buffered > 5 * self.compression:
+            self._compress()
+
+    def update(self, values) -> "QuantileDigest":
+        """
+        Adds values to the stream.
+
+        Args:
+        - values (float or array-like of float): the values to add
+
+        Returns:
+        - QuantileDigest: this digest
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if len(values):
+            self._add(values, np.ones(len(values)), float(values.min()), float(values.max()))
+        return self
+
+    def _compress(self) -> None:
+        if not self._buffer:
+            return
+        means = np.concatenate([self._means] + [means for means, _ in self._buffer])
+        weights = np.concatenate([self._weights] + [weights for _, weights in self._buffer])
+        self._buffer = []
+        self._buffered = 0
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        # centroids are grouped by the log-odds (k2) scale function of the quantile at their middle
+        total = weights.sum()
+        middle = np.clip((np.cumsum(weights) - weights / 2) / total, 1e-300, None)
+        normalizer = 4 * np.log(max(total / self.compression, 1.0)) + 24
+        scale = self.compression / normalizer * (np.log(middle) - np.log(np.clip(1 - middle, 1e-300, None)))
+        groups = np.floor(scale - scale.min()).astype(np.int64)
+        groups = np.unique(groups, return_inverse=True)[1].ravel()
+        self._weights = np.bincount(groups, weights)
+        self._means = np.bincount(groups, weights * means) / self._weights
+
+    def quantile(self, q):
+        """
+        Estimates quantiles of the values.
+
+        Args:
+        - q (float or array-like of float): the quantiles to estimate, between 0 and 1
+
+        Returns:
+        - float or np.ndarray: the estimated value at each quantile, nan if the digest is empty
+        """
+        self._compress()
+        if self.count == 0:
+            result = np.full(np.shape(q), np.nan)
+        else:
+            # each centroid is placed at the middle of its weight, between the exact minimum and maximum
+            centers = np.cumsum(self._weights) - self._weights / 2
+            positions = np.concatenate([[0], centers, [self.count]])
+            values = np.concatenate([[self.min], self._means, [self.max]])
+            result = np.interp(np.asarray(q, dtype=np.float64) * self.count, positions, values)
+        return float(result) if np.ndim(result) == 0 else result
+
+    def __len__(self) -> int:
+        self._compress()
+        return len(self._means)
+
+
+class StreamingHistogram:
+    """
+    A class that counts a stream of values in fixed bins, with separate counts below and above the range of the bins.
+    """
+    def __init__(self, lower: float, upper: float, bins: int = 100) -> None:
+        """
+        Initializes an empty StreamingHistogram object with equal bins between two bounds.
+
+        Args:
+        - lower (float): the lower bound of the first bin
+        - upper (float): the upper bound of the last bin
+        - bins (int): the number of bins
+
+        Raises:
+        - ValueError: if upper is not above lower, or bins is not positive
+        """
+        if upper <= lower:
+            raise ValueError("Upper bound must be above the lower bound")
+        if bins < 1:
+            raise ValueError("Number of bins must be positive")
+        self.lower = lower
+        self.upper = upper
+        self.bins = bins
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    @classmethod
+    def merge(cls, histograms) -> "StreamingHistogram":
+        """
+        Merges the histograms of separate streams.
+
+        Args:
+        - histograms (iterable of StreamingHistogram): the histograms to merge, which must have the same bins
+
+        Returns:
+        - StreamingHistogram: the merged histogram
+
+        Raises:
+        - ValueError: if the histograms do not have the same bins
+        """
+        histograms = list(histograms)
+        if not histograms:
+            raise ValueError("At least one histogram is required")
+        first = histograms[0]
+        merged = cls(first.lower, first.upper, first.bins)
+        for histogram in histograms:
+            if (histogram.lower, histogram.upper, histogram.bins) != (first.lower, first.upper, first.bins):
+                raise ValueError("Only histograms with the same bins can be merged")
+            merged.counts += histogram.counts
+            merged.underflow += histogram.underflow
+            merged.overflow += histogram.overflow
+        return merged
+
+    @property
+    def edges(self) -> np.ndarray:
+        return np.linspace(self.lower, self.upper, self.bins + 1)
+
+    def update(self, values) -> "StreamingHistogram":
+        """
+        Adds values to the stream. Values equal to the upper bound are counted in the last bin.
+
+        Args:
+        - values (float or array-like of float): the values to add
+
+        Returns:
+        - StreamingHistogram: this histogram
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        indices = np.floor((values - self.lower) / (self.upper - self.lower) * self.bins)
+        indices = np.where(values == self.upper, self.bins - 1, indices)
+        self.underflow += int((indices < 0).sum())
+        self.overflow += int((indices >= self.bins).sum())
+        inside = indices[(indices >= 0) & (indices < self.bins)].astype(np.int64)
+        self.counts += np.bincount(inside, minlength=self.bins)
+        return self
+
+
+class StreamingSummary:
+    """
+    A class that summarizes the distribution of a present value over a stream of Monte Carlo trials, without storing the trials.
+    It answers the same questions as SimulationResult, with quantiles estimated by a QuantileDigest.
+    """
+    def __init__(self, compression: int = digest_compression, histogram_range: tuple = None, bins: int = 100) -> None:
+        """
+        Initializes an empty StreamingSummary object.
+
+        Args:
+        - compression (int): the compression of the quantile digest
+        - histogram_range (tuple of float): the lower and upper bounds of the histogram. None for no histogram
+        - bins (int): the number of bins of the histogram
+        """
+        self.moments = RunningMoments()
+        self.digest = QuantileDigest(compression)
+        self.histogram = StreamingHistogram(*histogram_range, bins) if histogram_range is not None else None
+
+    @classmethod
+    def merge(cls, summaries) -> "StreamingSummary":
+        """
+        Merges the summaries of separate streams, such as the chunks or workers of a simulation.
+
+        Args:
+        - summaries (iterable of StreamingSummary): the summaries to merge
+
+        Returns:
+        - StreamingSummary: the summary of every trial
+
+        Raises:
+        - ValueError: if some summaries have a histogram and others do not, or their histograms do not have the same bins
+        """
+        summaries = list(summaries)
+        merged = cls.__new__(cls)
+        merged.moments = RunningMoments.merge(summary.moments for summary in summaries)
+        merged.digest = QuantileDigest.merge(summary.digest for summary in summaries)
+        histograms = [summary.histogram for summary in summaries]
+        if any(histogram is None for histogram in histograms) and any(histogram is not None for histogram in histograms):
+            raise ValueError("Only summaries that all have a histogram, or none, can be merged")
+        merged.histogram = StreamingHistogram.merge(histograms) if histograms and histograms[0] is not None else None
+        return merged
+
+    def update(self, values) -> "StreamingSummary":
+        """
+        Adds the present values of trials to the summary.
+
+        Args:
+        - values (float or array-like of float): the present value of each trial
+
+        Returns:
+        - StreamingSummary: this summary
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self.moments.update(values)
+        self.digest.update(values)
+        if self.histogram is not None:
+            self.histogram.update(values)
+        return self
+
+    def __len__(self) -> int:
+        return self.moments.count
+
+    @property
+    def mean(self) -> float:
+        return self.moments.mean
+
+    @property
+    def std(self) -> float:
+        return self.moments.std
+
+    @property
+    def standard_error(self) -> float:
+        return self.moments.standard_error
+
+    def percentile(self, q):
+        """
+        Estimates percentiles of the present value.
+
+        Args:
+        - q (float or array-like of float): the percentiles to estimate, between 0 and 100
+
+        Returns:
+        - float or np.ndarray: the present value at each percentile
+        """
+        return self.digest.quantile(np.asarray(q, dtype=np.float64) / 100)
+
+    def value_at_risk(self, confidence: float = 0.95) -> float:
+        """
+        Estimates the value at risk, the shortfall from the mean present value that is not exceeded with the given confidence.
+
+        Args:
+        - confidence (float): the confidence level, between 0 and 1
+
+        Returns:
+        - float: the value at risk
+
+        Raises:
+        - ValueError: if confidence is not between 0 and 1
+        """
+        if confidence <= 0 or confidence >= 1:
+            raise ValueError("Confidence must be between 0 and 1")
+        return self.mean - self.percentile(100 * (1 - confidence))
+
+    def summary(self) -> dict:
+        """
+        Summarizes the distribution of the present value.
+
+        Returns:
+        - dict: the number of trials, mean, standard deviation, 5th/50th/95th percentiles and 95% value at risk
+        """
+        p5, p50, p95 = self.percentile([5, 50, 95])
+        return {"trials": len(self), "mean": self.mean, "std": self.std, "p5": float(p5), "p50": float(p50), "p95": float(p95), "var_95": self.value_at_risk(0.95)}
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import backends
+from mc_cash_flow import *
+
+tolerance = 1e-9
+
+
+@pytest.fixture(params=backends.backend_names)
+def backend(request):
+    if request.param not in backends.available_backends():
+        pytest.skip(f"the {request.param} backend is not available")
+    previous = backends.active
+    yield backends.set_backend(request.param)
+    backends.active = previous
+
+
+def _with_backend(name: str, calculate):
+    previous = backends.active
+    backends.set_backend(name)
+    try:
+        return calculate()
+    finally:
+        backends.active = previous
+
+
+def test_discount_schedule(backend):
+    rng = np.random.default_rng(0)
+    amounts, periods = rng.normal(1000, 300, 600), np.concatenate([np.arange(1.0, 301.0), rng.uniform(0, 400, 300)])
+    expected = backends.get_backend("python").discount_schedule(amounts, periods, 0.004)
+    assert backend.discount_schedule(amounts, periods, 0.004) == pytest.approx(expected, rel=tolerance)
+
+
+def test_growing_annuity(backend):
+    expected = backends.get_backend("python").growing_annuity(1500, 0.0017, 600)
+    np.testing.assert_allclose(backend.growing_annuity(1500, 0.0017, 600), expected, rtol=tolerance)
+
+
+def test_masked_present_values(backend):
+    rng = np.random.default_rng(1)
+    discounted, uniforms = rng.normal(100, 30, 600), rng.random((64, 600))
+    expected = backends.get_backend("python").masked_present_values(discounted, uniforms, 0.05)
+    np.testing.assert_allclose(backend.masked_present_values(discounted, uniforms, 0.05), expected, rtol=tolerance)
+
+
+def test_schedule_present_value(backend):
+    rng = np.random.default_rng(2)
+    # periods off the grid are discounted with the discount_schedule kernel
+    schedule = CashFlowSchedule(rng.normal(1000, 300, 500), rng.uniform(0, 360, 500), "M")
+    annuity = Annuity(1500, 300, time_frame="M", cash_flow_growth=InterestRate(0.02))
+    expected = _with_backend("python", lambda: (schedule.get_present_value(InterestRate(0.06)), CashFlowSchedule.from_annuity(annuity).get_present_value(InterestRate(0.06))))
+    assert schedule.get_present_value(InterestRate(0.06)) == pytest.approx(expected[0], rel=tolerance, abs=0.01)
+    assert CashFlowSchedule.from_annuity(annuity).get_present_value(InterestRate(0.06)) == pytest.approx(expected[1], rel=tolerance, abs=0.01)
+
+
+@pytest.mark.parametrize("method", ["plain", "antithetic", "stratified"])
+def test_simulate(backend, method):
+    annuity = MonteCarloAnnuity(1000, 120, time_frame="M", cash_flow_growth=InterestRate(0.02), chance_of_zero=0.1)
+    expected = _with_backend("python", lambda: annuity.simulate(InterestRate(0.06), 500, seed=3, method=method, control_variate=True))
+    result = annuity.simulate(InterestRate(0.06), 500, seed=3, method=method, control_variate=True)
+    np.testing.assert_allclose(result.present_values, expected.present_values, rtol=tolerance)
+    assert result.mean == pytest.approx(expected.mean, rel=tolerance)
+
+
+def test_parity_raises_without_assert():
+    with pytest.raises(RuntimeError):
+        backends.parity(["numpy"], tolerance=-1.0)
+
+
+def test_unavailable_backend_is_not_retried(monkeypatch):
+    if "numba" in backends.available_backends():
+        pytest.skip("numba is installed")
+    # the first call above failed to import numba, and later calls must not import it again
+    monkeypatch.setattr(backends, "_numba_backend", lambda: pytest.fail("numba import retried"))
+    assert backends.available_backends() == ["python", "numpy"]
+    with pytest.raises(ImportError):
+        backends.get_backend("numba")
@@ -0,0 +1,38 @@
+import csv
+
+import pytest
+
+from batch import *
+
+header = "property_price,down_payment,discount_rate,mortgage_rate,mortgage_length,rent_amount,rent_growth\n"
+
+
+def _write(path, text: str) -> str:
+    path.write_text(text)
+    return str(path)
+
+
+def test_empty_optional_cell_takes_its_default(tmp_path):
+    deals = _write(tmp_path / "deals.csv", header + "300000,50000,0.06,0.045,25,2000,\n300000,50000,0.06,0.045,25,2000,0\n")
+    assert value_file(deals, str(tmp_path / "out.csv")) == 2
+    with open(tmp_path / "out.csv", newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert rows[0]["present_value"] == rows[1]["present_value"]
+
+
+def test_header_only_file_keeps_the_header(tmp_path):
+    deals = _write(tmp_path / "deals.csv", header)
+    assert value_file(deals, str(tmp_path / "out.csv")) == 0
+    assert (tmp_path / "out.csv").read_text().strip().split(",")[-2:] == ["present_value", "price_of_property"]
+
+
+def test_empty_file_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match="no header"):
+        value_file(_write(tmp_path / "deals.csv", ""), str(tmp_path / "out.csv"))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 100])
+def test_fractional_mortgage_length_is_rejected_with_its_row(tmp_path, chunk_size):
+    deals = _write(tmp_path / "deals.csv", header + "300000,50000,0.06,0.045,25,2000,0\n300000,50000,0.06,0.045,25.5,2000,0\n")
+    with pytest.raises(ValueError, match="Row 2: mortgage_length must be a whole number of years"):
+        value_file(deals, str(tmp_path / "out.csv"), chunk_size)
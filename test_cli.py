@@ -0,0 +1,23 @@
+import json
+
+import pytest
+
+from cli import main
+
+deal = ["--down-payment", "50000", "--mortgage-length", "25", "--rent-amount", "2000"]
+
+
+@pytest.mark.parametrize("discount_rate", ["0.06", "1:0.06"])
+def test_zero_mortgage_rate_repays_the_loan_in_equal_parts(capsys, discount_rate):
+    assert main(["present-value", "--property-price", "300000", "--discount-rate", discount_rate, "--mortgage-rate", "0"] + deal) == 0
+    assert main(["price", "--discount-rate", discount_rate, "--mortgage-rate", "0"] + deal) == 0
+    present_value, price = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert present_value["present_value"] == pytest.approx(229572.28, abs=1)
+    assert price["price_of_property"] == pytest.approx(239553.75, abs=1)
+
+
+@pytest.mark.parametrize("discount_rate", ["0.06", "1:0.06"])
+def test_deal_without_a_mortgage_payment_is_an_error(capsys, discount_rate):
+    arguments = ["present-value", "--property-price", "300000", "--discount-rate", discount_rate, "--mortgage-rate", "0", "--mortgage-length", "0", "--down-payment", "50000", "--rent-amount", "2000"]
+    assert main(arguments) == 1
+    assert "error" in json.loads(capsys.readouterr().err)
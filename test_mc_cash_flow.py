@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from mc_cash_flow import *
+
+
+@pytest.mark.parametrize("annuity", [
+    MonteCarloAnnuity(1000, 120, time_frame="M", chance_of_zero=0.2),
+    MonteCarloPerpetuity(2000, time_frame="M", cash_flow_growth=InterestRate(0.02), chance_of_zero=0.05),
+])
+def test_control_variate_is_distinct_from_the_present_value(annuity):
+    plain = annuity.simulate(InterestRate(0.06), 20000, seed=1)
+    controlled = annuity.simulate(InterestRate(0.06), 20000, seed=1, control_variate=True)
+    assert controlled.control_coefficient != pytest.approx(1.0)
+    assert controlled.standard_error > 1e-6 * abs(controlled.mean)
+    assert controlled.standard_error <= plain.standard_error
+    assert controlled.mean == pytest.approx(plain.mean, abs=4 * plain.standard_error)
+
+
+def test_adaptive_simulation_with_control_variate_runs_until_the_target():
+    annuity = MonteCarloAnnuity(1000, 120, time_frame="M", chance_of_zero=0.2)
+    result = annuity.simulate_adaptive(InterestRate(0.06), target_standard_error=5, batch_trials=1000, seed=2, control_variate=True)
+    assert len(result) > 1000
+    assert 0 < result.standard_error <= 5
+
+
+@pytest.mark.parametrize("method", ["plain", "antithetic", "stratified"])
+def test_control_variate_standard_error_matches_the_spread_across_seeds(method):
+    annuity = MonteCarloAnnuity(1000, 120, time_frame="M", chance_of_zero=0.2)
+    results = [annuity.simulate(InterestRate(0.06), 2000, seed=seed, method=method, control_variate=True) for seed in range(60)]
+    spread = np.std([result.mean for result in results], ddof=1)
+    reported = np.mean([result.standard_error for result in results])
+    assert reported == pytest.approx(spread, rel=0.35, abs=1e-6)
@@ -0,0 +1,23 @@
+import pytest
+
+from mc_paths import *
+from yield_curve import YieldCurve
+
+
+@pytest.mark.parametrize("discount_rate", [
+    InterestRate(0.05),
+    YieldCurve([1, 10, 30], [0.03, 0.04, 0.05]),
+    StochasticDiscountRate(0.12, volatility=0.01, long_term_rate=0.05),
+])
+def test_diverging_perpetuity_is_rejected(discount_rate):
+    perpetuity = PathPerpetuity(1000, "M", cash_flow_growth=InterestRate(0.10))
+    with pytest.raises(ValueError, match="does not converge"):
+        perpetuity.simulate(discount_rate, 10, seed=0)
+    if not isinstance(discount_rate, StochasticDiscountRate):
+        with pytest.raises(ValueError, match="does not converge"):
+            perpetuity.get_expected_present_value(discount_rate)
+
+
+def test_expected_present_value_of_a_perpetuity_is_not_truncated():
+    perpetuity = PathPerpetuity(1000, "Y", cash_flow_growth=InterestRate(0.02), vacancy_rate=0.1)
+    assert perpetuity.get_expected_present_value(InterestRate(0.05)) == pytest.approx(0.9 * 1000 / 0.03 * 1.02, rel=1e-6)
@@ -0,0 +1,29 @@
+from valuation_cache import *
+
+
+def test_filling_past_the_limits_evicts_the_oldest_values_in_a_batch(tmp_path):
+    with ValuationCache(str(tmp_path / "cache.sqlite"), max_entries=50, max_bytes=10 ** 6) as cache:
+        for index in range(200):
+            cache.put(f"key{index}", index)
+            assert len(cache) <= 50
+        # the last eviction went down to the low-water mark, and only newer values were kept
+        assert int(50 * eviction_low_water) <= len(cache) <= 50
+        assert "key199" in cache and "key0" not in cache
+        count, size = cache._connection.execute("SELECT COUNT(*), SUM(size) FROM valuations").fetchone()
+        assert (len(cache), cache.size) == (count, size)
+
+
+def test_size_limit_and_totals_survive_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    value = b"x" * 1000
+    with ValuationCache(path, max_bytes=20000) as cache:
+        for index in range(100):
+            cache.put(f"key{index}", value)
+            assert cache.size <= 20000
+        cache.put("key99", b"")
+        assert cache.size <= 20000 * eviction_low_water + 1000
+        totals = len(cache), cache.size
+    with ValuationCache(path, max_bytes=20000) as cache:
+        assert (len(cache), cache.size) == totals
+        cache.clear()
+        assert (len(cache), cache.size) == (0, 0)
@@ -0,0 +1,38 @@
+import asyncio
+import functools
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from valuation_service import *
+from valuation_service import _value_batch
+
+deal = {"property_price": 300000, "down_payment": 50000, "discount_rate": 0.06, "mortgage_rate": 0.045, "mortgage_length": 25, "rent_amount": 2000}
+
+
+def _respond(path: str, request) -> tuple:
+    # answers a request with the batches valued on threads rather than worker processes
+    async def respond():
+        service = ValuationService()
+        with ThreadPoolExecutor(1) as executor:
+            for quantity in ("present_value", "price_of_property"):
+                service.batchers[quantity] = MicroBatcher(functools.partial(_value_batch, quantity), executor)
+            status, payload = await service._respond("POST", path, json.dumps(request).encode())
+        json.dumps(payload, allow_nan=False)
+        return status, payload
+    return asyncio.run(respond())
+
+
+@pytest.mark.parametrize("inputs", [{"rent_amount": 1e308}, {"rent_growth": 0.07}])
+def test_non_finite_value_of_a_deal_is_an_error(inputs):
+    status, payload = _respond("/present_value", dict(deal, **inputs))
+    assert status == 400
+    assert "not finite" in payload["error"]
+
+
+def test_non_finite_value_in_a_list_is_an_error_for_its_deal_only():
+    status, payload = _respond("/present_value", [deal, dict(deal, rent_amount=1e308)])
+    assert status == 200
+    assert isinstance(payload["present_value"][0], float)
+    assert "not finite" in payload["present_value"][1]["error"]
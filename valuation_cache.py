@@ -0,0 +1,245 @@
+import hashlib
+import json
+import numbers
+import pickle
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# version of the valuation formulas, part of every key so a change in the formulas does not reuse stale values
+cache_version = 1
+
+# fraction of the limits a full cache is evicted down to, so eviction runs once for a batch of puts
+eviction_low_water = 0.9
+
+
+def _canonical(value):
+    # a JSON-serializable form of a valuation input, equal for inputs that value the same
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, numbers.Real):
+        return repr(float(value)) if float(value) == value else repr(value)
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, dict):
+        return {str(name): _canonical(item) for name, item in value.items()}
+    if isinstance(value, np.random.SeedSequence):
+        return ["SeedSequence", _canonical(value.entropy), _canonical(value.spawn_key)]
+    # immutable rates such as InterestRate and YieldCurve are rebuilt from their class and arguments
+    rebuild = value.__reduce__()
+    if isinstance(rebuild, tuple) and len(rebuild) == 2:
+        return [type(value).__name__, _canonical(rebuild[1])]
+    raise TypeError(f"Cannot build a cache key from {type(value).__name__}")
+
+
+def canonical_key(kind: str, **inputs) -> str:
+    """
+    Builds the cache key of a valuation, a hash of its kind and inputs that does not depend on the order of the inputs,
+    or on whether numbers are given as int, float or NumPy scalars.
+
+    Args:
+    - kind (str): the kind of valuation, such as the class of the valued object
+    - **inputs: the inputs of the valuation. Numbers, strings, None, lists, dicts, InterestRate, YieldCurve and seeds are supported
+
+    Returns:
+    - str: the key of the valuation
+
+    Raises:
+    - TypeError: if an input is not supported
+    """
+    text = json.dumps([cache_version, kind, _canonical(inputs)], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def valuation_key(valuation, discount_rate, n_trials: int = None, seed=None) -> str:
+    """
+    Builds the cache key of the present value of an annuity, perpetuity or Monte Carlo annuity, from its amount, growth,
+    number of payments, time frame and chance of zero, without building its cash flows.
+
+    Args:
+    - valuation (Annuity, Perpetuity, MonteCarloAnnuity or MonteCarloPerpetuity): the valued object
+    - discount_rate (InterestRate or YieldCurve): the discount rate
+    - n_trials (int): the number of trials of a simulation. None for get_present_value
+    - seed (int or np.random.SeedSequence): the seed of the simulation
+
+    Returns:
+    - str: the key of the valuation
+    """
+    return canonical_key(type(valuation).__name__, amount=valuation.amount, cash_flow_growth=valuation.cash_flow_growth, payments=valuation.payments,
+                         time_frame=valuation.time_frame, chance_of_zero=getattr(valuation, "chance_of_zero", 0), discount_rate=discount_rate,
+                         n_trials=n_trials, seed=seed)
+
+
+class ValuationCache:
+    """
+    A class that stores present values in a local SQLite file, so they are reused across runs.
+
+    The cache holds at most max_entries values and max_bytes of pickled values. When a put goes beyond either limit, the
+    least recently used values are evicted in one batch, down to eviction_low_water of both limits. The number and
+    total size of the values are kept in the file, so puts do not scan the cache. It can be shared by threads, and by
+    processes through the file. Values are unpickled when read, so only open cache files you wrote yourself.
+    """
+    def __init__(self, path: str, max_entries: int = 100000, max_bytes: int = 256 * 2 ** 20) -> None:
+        """
+        Opens a ValuationCache object on a SQLite file, creating it if needed.
+
+        Args:
+        - path (str): the path of the SQLite file, or ":memory:" for a cache that is not persisted
+        - max_entries (int): the maximum number of values kept
+        - max_bytes (int): the maximum total size of the pickled values kept
+
+        Raises:
+        - ValueError: if max_entries or max_bytes is not positive
+        """
+        if max_entries < 1 or max_bytes < 1:
+            raise ValueError("Cache limits must be positive")
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            if path != ":memory:":
+                self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS valuations (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, last_used INTEGER NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS valuations_last_used ON valuations (last_used)")
+            # the running number and size of the values, counted once for a file written before the totals were kept
+            self._connection.execute("CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), count INTEGER NOT NULL, size INTEGER NOT NULL)")
+            self._connection.execute("INSERT OR IGNORE INTO totals SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM valuations")
+
+    def __enter__(self) -> "ValuationCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the SQLite file.
+        """
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT count FROM totals").fetchone()[0]
+
+    @property
+    def size(self) -> int:
+        # the total size of the pickled values
+        with self._lock:
+            return self._connection.execute("SELECT size FROM totals").fetchone()[0]
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return self._connection.execute("SELECT 1 FROM valuations WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key: str, default=None):
+        """
+        Reads a value, marking it as recently used.
+
+        Args:
+        - key (str): the key of the value, as built by canonical_key or valuation_key
+        - default: the value returned if the key is not cached
+
+        Returns:
+        - the cached value, or default
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT value FROM valuations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return default
+            self._connection.execute("UPDATE valuations SET last_used = ? WHERE key = ?", (time.time_ns(), key))
+        return pickle.loads(row[0])
+
+    def put(self, key: str, value) -> None:
+        """
+        Stores a value, evicting the least recently used values beyond the limits of the cache.
+
+        Args:
+        - key (str): the key of the value, as built by canonical_key or valuation_key
+        - value: the value, which must be picklable
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            # the totals are updated in the same transaction as the values, so other processes see them consistent
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute("SELECT size FROM valuations WHERE key = ?", (key,)).fetchone()
+                added, added_size = (0, len(data) - row[0]) if row is not None else (1, len(data))
+                self._connection.execute("INSERT OR REPLACE INTO valuations (key, value, size, last_used) VALUES (?, ?, ?, ?)", (key, data, len(data), time.time_ns()))
+                self._connection.execute("UPDATE totals SET count = count + ?, size = size + ?", (added, added_size))
+                count, size = self._connection.execute("SELECT count, size FROM totals").fetchone()
+                if count > self.max_entries or size > self.max_bytes:
+                    self._evict(count, size)
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def _evict(self, count: int, size: int) -> None:
+        # evicts the least recently used values until both totals are under the low-water mark
+        count_target, size_target = int(self.max_entries * eviction_low_water), int(self.max_bytes * eviction_low_water)
+        evicted, evicted_size = [], 0
+        for key, value_size in self._connection.execute("SELECT key, size FROM valuations ORDER BY last_used"):
+            if count - len(evicted) <= count_target and size - evicted_size <= size_target:
+                break
+            evicted.append((key,))
+            evicted_size += value_size
+        self._connection.executemany("DELETE FROM valuations WHERE key = ?", evicted)
+        self._connection.execute("UPDATE totals SET count = count - ?, size = size - ?", (len(evicted), evicted_size))
+
+    def clear(self) -> None:
+        """
+        Removes every value.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.execute("DELETE FROM valuations")
+            self._connection.execute("UPDATE totals SET count = 0, size = 0")
+            self._connection.execute("COMMIT")
+
+    def get_or_compute(self, key: str, calculate):
+        """
+        Reads a value, or calculates and stores it if it is not cached.
+
+        Args:
+        - key (str): the key of the value
+        - calculate (callable): calculates the value, called without arguments
+
+        Returns:
+        - the cached or calculated value
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = calculate()
+            self.put(key, value)
+        return value
+
+    def present_value(self, valuation, discount_rate, n_trials: int = None, seed=None, progress=None):
+        """
+        Returns the present value of an annuity, perpetuity or Monte Carlo annuity from the cache, valuing it only if it is not cached.
+
+        Args:
+        - valuation (Annuity, Perpetuity, MonteCarloAnnuity or MonteCarloPerpetuity): the valued object
+        - discount_rate (InterestRate or YieldCurve): the discount rate
+        - n_trials (int): the number of trials to simulate a Monte Carlo annuity. None for get_present_value, which is never cached
+          for a Monte Carlo annuity since it is a single random draw
+        - seed (int or np.random.SeedSequence): the seed of the simulation. Simulations without a seed, or seeded with a Generator,
+          are not deterministic and are never cached
+        - progress (callable): passed to simulate when the simulation runs
+
+        Returns:
+        - float or SimulationResult: the result of get_present_value, or of simulate when n_trials is given
+        """
+        if n_trials is None:
+            if hasattr(valuation, "simulate"):
+                # a single Monte Carlo draw is random
+                return valuation.get_present_value(discount_rate)
+            return self.get_or_compute(valuation_key(valuation, discount_rate), lambda: valuation.get_present_value(discount_rate))
+        if seed is None or isinstance(seed, np.random.Generator):
+            return valuation.simulate(discount_rate, n_trials, seed=seed, progress=progress)
+        return self.get_or_compute(valuation_key(valuation, discount_rate, n_trials, seed), lambda: valuation.simulate(discount_rate, n_trials, seed=seed, progress=progress))
@@ -0,0 +1,375 @@
+import argparse
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from deal_valuation import *
+from deal_model import DealModel, default_deal_inputs
+from streaming_stats import StreamingSummary
+from yield_curve import parse_discount_rate
+
+# largest number of deals valued together in one batch
+max_batch_size = 1024
+
+# seconds the first request of a batch waits for other requests to join it
+max_batch_delay = 0.002
+
+# largest number of trials a simulation request may ask for. A monthly rent perpetuity takes about 0.1 ms per trial,
+# so a request holds a worker process for at most about 2 seconds
+max_simulation_trials = 20000
+
+# largest request body the service reads, in bytes, enough for a batch of max_batch_size deals
+max_request_bytes = 2 ** 20
+
+# largest number of header lines of a request
+max_header_lines = 100
+
+# reason phrases of the HTTP statuses the service answers with
+http_reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Content Too Large", 500: "Internal Server Error"}
+
+
+def _parse_deal(deal, names: list) -> dict:
+    # the deal inputs of a request as floats, with the optional inputs filled in
+    if not isinstance(deal, dict):
+        raise ValueError("A deal must be a JSON object")
+    unknown = set(deal) - set(names)
+    if unknown:
+        raise ValueError(f"Unknown deal inputs: {', '.join(sorted(unknown))}")
+    inputs = {}
+    for name in names:
+        value = deal.get(name, default_deal_inputs.get(name))
+        if value is None:
+            raise ValueError(f"Missing deal input: {name}")
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"Deal input {name} must be a number")
+        inputs[name] = float(value)
+    return inputs
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> dict:
+    # the headers of a request, by lower-case name, up to the blank line ending them
+    headers = {}
+    for _ in range(max_header_lines + 1):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            return headers
+        name, separator, value = line.decode("latin-1").partition(":")
+        if not separator:
+            raise ValueError("Malformed header")
+        headers[name.strip().lower()] = value.strip()
+    raise ValueError("Too many headers")
+
+
+def _value_batch(quantity: str, deals: list) -> list:
+    # runs in a worker process: one vectorized valuation for every deal of the batch
+    columns = {name: np.array([deal[name] for deal in deals]) for name in deals[0]}
+    with np.errstate(over="ignore"):
+        values = present_value_of_deals(**columns) if quantity == "present_value" else price_of_property_of_deals(**columns)
+    # JSON has no NaN or infinity, so deals without a finite value, such as a diverging perpetuity or an overflow, are errors
+    return [float(value) if np.isfinite(value) else ValueError(f"The {quantity} of the deal is not finite") for value in values]
+
+
+def _warm_up() -> None:
+    # runs in a worker process, which imports this module and NumPy on its first task
+    return None
+
+
+def _simulate_deal(inputs: dict, trials: int, seed, percentiles: list) -> dict:
+    # runs in a worker process: a Monte Carlo simulation of the rent of one deal
+    model = DealModel(rent_trials=trials, seed=seed, **inputs)
+    return {"present_value": model.present_value(), "percentiles": dict(zip(map(str, percentiles), np.atleast_1d(model.present_value_percentile(percentiles)).tolist()))}
+
+
+class MicroBatcher:
+    """
+    A class that groups the requests arriving within a short delay into one batch, valued by a single call on an executor.
+    """
+    def __init__(self, function, executor, max_size: int = max_batch_size, max_delay: float = max_batch_delay) -> None:
+        """
+        Initializes a MicroBatcher object with the batch function and the executor it runs on.
+
+        Args:
+        - function (callable): values a list of items and returns the list of their results. A result that is an exception is
+          raised for its item only. Must be picklable for a process pool
+        - executor (concurrent.futures.Executor): the executor the batches run on
+        - max_size (int): the number of items at which a batch is run without waiting
+        - max_delay (float): the seconds the first item of a batch waits for others
+        """
+        self.function = function
+        self.executor = executor
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.batches = 0
+        self.items = 0
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, item):
+        """
+        Adds an item to the next batch and waits for its result.
+
+        Args:
+        - item: the item to value
+
+        Returns:
+        - the result of the item
+
+        Raises:
+        - Exception: whatever the batch function raised for the batch of the item, or returned for the item
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: list) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self.function, [item for item, _ in batch])
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        else:
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+class ValuationService:
+    """
+    A class that serves deal valuations as JSON over HTTP, on an asyncio event loop.
+
+    Endpoints:
+    - POST /present_value: the present value of a deal, or of a list of deals, as in present_value_of_deals
+    - POST /price_of_property: the maximum price of property of a deal, or of a list of deals, as in price_of_property_of_deals.
+      A deal without a finite value is answered with 400, or with an {"error": message} object in place of its value in a list
+    - POST /simulate: the mean and percentiles of the present value of a deal over a Monte Carlo simulation of the rent.
+      Takes the deal inputs, and optionally trials, seed and percentiles. The discount rate may be a tenor:rate curve
+    - GET /stats: the number of requests, errors, throughput and latency of each endpoint, and the batches run
+
+    Concurrent present value and price requests are micro-batched into one vectorized valuation, and every valuation
+    runs on a process pool so the event loop keeps accepting requests. Malformed requests are answered with 400, and
+    bodies larger than max_body with 413, before they are read.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 8000, workers: int = None, max_size: int = max_batch_size, max_delay: float = max_batch_delay,
+                 max_body: int = max_request_bytes) -> None:
+        """
+        Initializes a ValuationService object. The service starts listening with start.
+
+        Args:
+        - host (str): the address to listen on
+        - port (int): the port to listen on. 0 for any free port, which is set once the service is started
+        - workers (int): the number of worker processes. None for the number of CPUs
+        - max_size (int): the number of deals at which a batch is valued without waiting
+        - max_delay (float): the seconds the first deal of a batch waits for others
+        - max_body (int): the largest request body read, in bytes. Larger requests are answered with 413
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.max_body = max_body
+        self.executor = None
+        self.batchers = {}
+        self._server = None
+        self._started = None
+        self._requests = {}
+        self._errors = {}
+        self._latencies = {}
+        self._routes = {
+            "/present_value": ("POST", functools.partial(self._value, "present_value")),
+            "/price_of_property": ("POST", functools.partial(self._value, "price_of_property")),
+            "/simulate": ("POST", self._simulate),
+            "/stats": ("GET", self._stats),
+        }
+
+    async def start(self) -> None:
+        """
+        Starts the worker processes, waiting for them to be ready, and listens for requests.
+        """
+        # workers are spawned rather than forked, since forking while the pool's threads run can deadlock the workers
+        self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, _warm_up) for _ in range(self.workers or os.cpu_count() or 1)))
+        for quantity in ("present_value", "price_of_property"):
+            self.batchers[quantity] = MicroBatcher(functools.partial(_value_batch, quantity), self.executor, self.max_size, self.max_delay)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._started = time.perf_counter()
+
+    async def close(self) -> None:
+        """
+        Stops listening and shuts down the worker processes.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    async def serve_forever(self) -> None:
+        """
+        Starts the service and serves requests until cancelled.
+        """
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                    if not request_line:
+                        break
+                    method, target, version = request_line.decode("latin-1").split()
+                    headers = await _read_headers(reader)
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError("Negative content length")
+                except ValueError:
+                    # malformed request lines, headers or lengths, including lines longer than the reader's limit
+                    await self._send(writer, 400, {"error": "Malformed request"}, False)
+                    break
+                start = time.perf_counter()
+                path = target.split("?")[0]
+                if length > self.max_body:
+                    # the body is not read, so the connection cannot be reused
+                    status, payload, keep_alive = 413, {"error": f"Request body must be at most {self.max_body} bytes"}, False
+                else:
+                    body = await reader.readexactly(length)
+                    status, payload = await self._respond(method, path, body)
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                await self._send(writer, status, payload, keep_alive)
+                if path in self._routes:
+                    self._record(path, status, time.perf_counter() - start)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # dropped connections are closed
+            pass
+        finally:
+            writer.close()
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool) -> None:
+        data = json.dumps(payload).encode()
+        writer.write((f"HTTP/1.1 {status} {http_reasons[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode() + data)
+        await writer.drain()
+
+    async def _respond(self, method: str, path: str, body: bytes) -> tuple:
+        if path not in self._routes:
+            return 404, {"error": "Not found"}
+        route_method, endpoint = self._routes[path]
+        if method != route_method:
+            return 405, {"error": f"Use {route_method}"}
+        try:
+            return 200, await endpoint(json.loads(body) if body else None)
+        except (ValueError, TypeError, KeyError) as error:
+            return 400, {"error": str(error)}
+        except Exception as error:
+            return 500, {"error": str(error)}
+
+    def _record(self, path: str, status: int, seconds: float) -> None:
+        self._requests[path] = self._requests.get(path, 0) + 1
+        if status != 200:
+            self._errors[path] = self._errors.get(path, 0) + 1
+        self._latencies.setdefault(path, StreamingSummary()).update(seconds * 1000)
+
+    async def _value(self, quantity: str, request) -> dict:
+        names = [name for name in deal_inputs if quantity == "present_value" or name != "property_price"]
+        batcher = self.batchers[quantity]
+        if isinstance(request, list):
+            deals = [_parse_deal(deal, names) for deal in request]
+            # a deal that cannot be valued is answered with its error, in place of its value
+            results = await asyncio.gather(*(batcher.submit(deal) for deal in deals), return_exceptions=True)
+            for result in results:
+                if not isinstance(result, ValueError) and isinstance(result, BaseException):
+                    raise result
+            return {quantity: [{"error": str(result)} if isinstance(result, ValueError) else result for result in results]}
+        return {quantity: await batcher.submit(_parse_deal(request, names))}
+
+    async def _simulate(self, request) -> dict:
+        if not isinstance(request, dict):
+            raise ValueError("A simulation request must be a JSON object")
+        request = dict(request)
+        trials = request.pop("trials", 10000)
+        seed = request.pop("seed", None)
+        percentiles = request.pop("percentiles", [5, 50, 95])
+        if not isinstance(trials, int) or trials < 1 or trials > max_simulation_trials:
+            raise ValueError(f"Trials must be an integer between 1 and {max_simulation_trials}")
+        if seed is not None and not isinstance(seed, int):
+            raise ValueError("Seed must be an integer")
+        if not isinstance(percentiles, list) or not all(isinstance(q, (int, float)) and 0 <= q <= 100 for q in percentiles):
+            raise ValueError("Percentiles must be a list of numbers between 0 and 100")
+        discount_rate = request.pop("discount_rate", None)
+        inputs = _parse_deal(request, [name for name in deal_inputs if name != "discount_rate"])
+        inputs["discount_rate"] = parse_discount_rate(discount_rate) if isinstance(discount_rate, str) else _parse_deal({"discount_rate": discount_rate}, ["discount_rate"])["discount_rate"]
+        return await asyncio.get_running_loop().run_in_executor(self.executor, _simulate_deal, inputs, trials, seed, percentiles)
+
+    async def _stats(self, request) -> dict:
+        return self.stats()
+
+    def stats(self) -> dict:
+        """
+        Returns the statistics of the requests served so far.
+
+        Returns:
+        - dict: the uptime in seconds, then for each endpoint the number of requests and errors, the requests per second
+          since the start and the mean, 50th, 95th and 99th percentile latency in milliseconds, and for each batched
+          quantity the number of batches and their mean size
+        """
+        uptime = time.perf_counter() - self._started if self._started is not None else 0.0
+        endpoints = {}
+        for path, latencies in self._latencies.items():
+            p50, p95, p99 = latencies.percentile([50, 95, 99])
+            endpoints[path] = {
+                "requests": self._requests[path],
+                "errors": self._errors.get(path, 0),
+                "throughput": self._requests[path] / uptime if uptime else 0.0,
+                "latency_ms": {"mean": latencies.mean, "p50": float(p50), "p95": float(p95), "p99": float(p99)},
+            }
+        batches = {quantity: {"batches": batcher.batches, "mean_size": batcher.items / batcher.batches if batcher.batches else 0.0} for quantity, batcher in self.batchers.items()}
+        return {"uptime": uptime, "endpoints": endpoints, "batches": batches}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve deal valuations as JSON over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on")
+    parser.add_argument("--workers", type=int, help="number of worker processes, the number of CPUs by default")
+    parser.add_argument("--max-body", type=int, default=max_request_bytes, help="largest request body in bytes")
+    arguments = parser.parse_args()
+    try:
+        asyncio.run(ValuationService(arguments.host, arguments.port, arguments.workers, max_body=arguments.max_body).serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,180 @@
+import functools
+
+import numpy as np
+
+from cash_flows import *
+
+# ways of interpolating between the points of a yield curve
+interpolations = ["linear", "log_linear"]
+
+
+class YieldCurve:
+    """
+    A class that represents a yield curve, built from yearly zero rates at given tenors.
+
+    A YieldCurve can be used anywhere an InterestRate discounts cash flows. Annuities and perpetuities are then valued
+    as schedules, since the growing-annuity formulas need a flat rate: perpetuities over their first 1000 years, which
+    only converge if their growth is lower than the long-end rate. Like InterestRate, it is immutable and hashable,
+    and its discount factor tables are computed once and shared.
+    """
+    __slots__ = ("tenors", "rates", "interpolation", "_times", "_log_discounts")
+
+    def __init__(self, tenors, rates, interpolation: str = "linear") -> None:
+        """
+        Initializes a YieldCurve object with the tenors, the zero rates at those tenors and the interpolation between them.
+        Rates are extrapolated flat before the first tenor and after the last one.
+
+        Args:
+        - tenors (array-like of float): the tenors of the curve points, in years, strictly increasing and positive
+        - rates (array-like of float): the yearly, annually compounded zero rate at each tenor
+        - interpolation (str): "linear" to interpolate the zero rates, "log_linear" to interpolate the log of the discount factors
+
+        Raises:
+        - ValueError: if the tenors and rates do not match, the tenors are not strictly increasing and positive, or interpolation is unknown
+        """
+        tenors = tuple(float(tenor) for tenor in tenors)
+        rates = tuple(float(rate) for rate in rates)
+        if not tenors or len(tenors) != len(rates):
+            raise ValueError("A yield curve needs one rate per tenor")
+        if tenors[0] <= 0 or any(later <= earlier for earlier, later in zip(tenors, tenors[1:])):
+            raise ValueError("Tenors must be positive and strictly increasing")
+        if interpolation not in interpolations:
+            raise ValueError("Interpolation must be linear/log_linear")
+        object.__setattr__(self, "tenors", tenors)
+        object.__setattr__(self, "rates", rates)
+        object.__setattr__(self, "interpolation", interpolation)
+        object.__setattr__(self, "_times", np.array(tenors))
+        object.__setattr__(self, "_log_discounts", -np.array(tenors) * np.log1p(rates))
+
+    @classmethod
+    def parse(cls, text: str, interpolation: str = "linear") -> "YieldCurve":
+        """
+        Creates a yield curve from text of comma-separated tenor:rate points, such as "1:0.04, 5:0.045, 30:0.05".
+
+        Args:
+        - text (str): the points of the curve
+        - interpolation (str): the interpolation between the points
+
+        Returns:
+        - YieldCurve: the yield curve
+
+        Raises:
+        - ValueError: if the text is not a list of tenor:rate points
+        """
+        points = [point.split(":") for point in text.split(",") if point.strip()]
+        if not points or any(len(point) != 2 for point in points):
+            raise ValueError("A yield curve must be written as tenor:rate points separated by commas")
+        return cls([float(tenor) for tenor, _ in points], [float(rate) for _, rate in points], interpolation)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("YieldCurve is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("YieldCurve is immutable")
+
+    def __reduce__(self):
+        return (YieldCurve, (self.tenors, self.rates, self.interpolation))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, YieldCurve):
+            return NotImplemented
+        return (self.tenors, self.rates, self.interpolation) == (other.tenors, other.rates, other.interpolation)
+
+    def __hash__(self) -> int:
+        return hash((self.tenors, self.rates, self.interpolation))
+
+    def __repr__(self) -> str:
+        return f"YieldCurve({list(self.tenors)!r}, {list(self.rates)!r}, {self.interpolation!r})"
+
+    def _discount_at(self, years: np.ndarray) -> np.ndarray:
+        if self.interpolation == "linear":
+            return (1 + np.interp(years, self._times, self.rates)) ** -years
+        # log-linear interpolation of the discount factors, with flat zero rates outside the tenors
+        first_rate, last_rate = np.log1p(self.rates[0]), np.log1p(self.rates[-1])
+        log_discounts = np.interp(years, self._times, self._log_discounts)
+        log_discounts = np.where(years < self._times[0], -years * first_rate, log_discounts)
+        log_discounts = np.where(years > self._times[-1], -years * last_rate, log_discounts)
+        return np.exp(log_discounts)
+
+    @property
+    def long_end_rate(self) -> float:
+        # zero rates are extrapolated flat after the last tenor, so this is also the forward rate of the far future
+        return self.rates[-1]
+
+    def rate_at(self, tenor):
+        """
+        Returns the yearly zero rate of the curve at given tenors.
+
+        Args:
+        - tenor (float or array-like of float): the tenors, in years
+
+        Returns:
+        - float or np.ndarray: the zero rate at each tenor
+        """
+        years = np.asarray(tenor, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rates = np.where(years > 0, self._discount_at(years) ** (-1 / years) - 1, self.rates[0])
+        return float(rates) if rates.ndim == 0 else rates
+
+    def discount_factor(self, periods, time_frame: str):
+        """
+        Calculates the discount factor of cash flows receivable in a number of periods.
+
+        Args:
+        - periods (float or array-like of float): the number of periods until receipt
+        - time_frame (str): the time frame of the periods. Must be one of "Y", "M", "W", "D"
+
+        Returns:
+        - float or np.ndarray: the discount factor of each number of periods
+
+        Raises:
+        - Exception: if time_frame is not one of "Y", "M", "W", "D"
+        """
+        if time_frame not in time_frames:
+            raise Exception("Time frame must be Y/M/W/D")
+        factors = self._discount_at(np.asarray(periods, dtype=np.float64) / time_frame_conversion[time_frame])
+        return float(factors) if factors.ndim == 0 else factors
+
+    def discount_factors(self, time_frame: str, horizon: int) -> np.ndarray:
+        """
+        Returns the cumulative discount factors of periods 0 to horizon in the given time frame.
+        The tables are kept in a bounded cache, and are read-only.
+
+        Args:
+        - time_frame (str): the time frame of the periods. Must be one of "Y", "M", "W", "D"
+        - horizon (int): the last period of the table
+
+        Returns:
+        - np.ndarray: the discount factor of each period, starting at period 0
+
+        Raises:
+        - Exception: if time_frame is not one of "Y", "M", "W", "D"
+        """
+        if time_frame not in time_frames:
+            raise Exception("Time frame must be Y/M/W/D")
+        return _curve_discount_factors(self, time_frame, int(horizon))
+
+
+@functools.lru_cache(maxsize=discount_factor_cache_size)
+def _curve_discount_factors(curve: YieldCurve, time_frame: str, horizon: int) -> np.ndarray:
+    factors = curve._discount_at(np.arange(horizon + 1, dtype=np.float64) / time_frame_conversion[time_frame])
+    factors.flags.writeable = False
+    return factors
+
+
+def parse_discount_rate(text: str):
+    """
+    Parses a discount rate typed as a decimal, or a yield curve typed as tenor:rate points.
+
+    Args:
+    - text (str): the discount rate, such as "0.05" or "1:0.04, 10:0.05"
+
+    Returns:
+    - float or YieldCurve: the discount rate
+
+    Raises:
+    - ValueError: if the text is neither
+    """
+    if ":" in text:
+        return YieldCurve.parse(text)
+    return float(text)